@@ -0,0 +1,302 @@
+import multiprocessing
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from npc_manager import FIELDS, NO_STATE
+from simulation import NPC_SPAWNS, Simulation
+
+NPC_PARAMETERS = ("detection_range", "attack_range", "speed", "return_threshold")
+
+
+class WorldBatch:
+    def __init__(self, seeds: Sequence[int], max_ticks: int = 3600, **simulation_options):
+        # Every world gets its own seed and so its own obstacle layout, kept
+        # for the life of the batch: a finished episode resets its world in
+        # place. Player state lives in batch arrays and is stepped for all
+        # worlds at once (the worlds' own player fields go unused); each
+        # world's NPC manager runs over its slice of batch-wide NPC arrays,
+        # so resets, parameters and observations are array writes and
+        # reads. Only the per-NPC handler pass runs world by world.
+        self.seeds = list(seeds)
+        self.max_ticks = max_ticks
+        count = len(self.seeds)
+        per_world = len(NPC_SPAWNS)
+        self.npc_arrays = {
+            field: np.zeros(count * per_world, dtype=dtype) for field, dtype in FIELDS
+        }
+        self.npc_arrays["previous_state"].fill(NO_STATE)
+        self.worlds = [
+            Simulation(
+                seed=seed,
+                npc_arrays={
+                    field: values[index * per_world : (index + 1) * per_world]
+                    for field, values in self.npc_arrays.items()
+                },
+                **simulation_options,
+            )
+            for index, seed in enumerate(self.seeds)
+        ]
+        self.npc_shape = (count, per_world)
+
+        world = self.worlds[0]
+        self.start = np.array(world.player_pos, dtype=np.float64)
+        self.player = np.tile(self.start, (count, 1))
+        self.player_health = np.full(count, world.max_player_health, dtype=np.int64)
+        self.ticks = np.zeros(count, dtype=np.int64)
+        self.episode_damage = np.zeros(count, dtype=np.int64)
+
+        # Layouts never change during the batch, so the worlds' grids are
+        # stacked once for Pathfinding.distances_to_wall().
+        self.walkable = np.concatenate(
+            [np.frombuffer(other.pathfinding.walkable, dtype=np.uint8) for other in self.worlds]
+        )
+
+    def set_parameters(self, **parameters):
+        count = len(self.worlds)
+        for name, value in parameters.items():
+            if name not in NPC_PARAMETERS:
+                raise ValueError(f"unknown NPC parameter {name!r}")
+            values = np.broadcast_to(np.asarray(value, dtype=np.float64), (count,))
+            if name in self.npc_arrays:
+                self.npc_arrays[name].reshape(self.npc_shape)[:] = values[:, None]
+                # Guards read these, so every NPC is re-evaluated next tick.
+                self.npc_arrays["dirty"].fill(True)
+                continue
+            for world, world_value in zip(self.worlds, values.tolist()):
+                for npc in world.npcs:
+                    setattr(npc, name, world_value)
+
+    def reset(self) -> Dict[str, np.ndarray]:
+        self._reset_worlds(np.arange(len(self.worlds)))
+        return self.observe()
+
+    def _reset_worlds(self, indices: np.ndarray):
+        for index in indices.tolist():
+            self.worlds[index].reset()
+        self.player[indices] = self.start
+        self.player_health[indices] = self.worlds[0].max_player_health
+        self.ticks[indices] = 0
+        self.episode_damage[indices] = 0
+
+    def move_players(self, moves: np.ndarray):
+        # Simulation.move_player() for every world: each axis is tried in
+        # turn and kept when it stays on the map and passes can_move().
+        world = self.worlds[0]
+        step = world.player_speed * world.dt
+        radius = world.player_radius
+        pathfinding = world.pathfinding
+        body_radius = pathfinding.body_radius(radius)
+        limits = (world.width, world.height)
+        player = self.player
+        for axis in (0, 1):
+            moving = np.flatnonzero(moves[:, axis])
+            if not len(moving):
+                continue
+            position = player[moving]
+            target = position.copy()
+            target[:, axis] += moves[moving, axis] * step
+            on_map = (radius <= target[:, axis]) & (target[:, axis] < limits[axis] - radius)
+            base = moving * pathfinding.size
+            before = pathfinding.distances_to_wall(
+                position[:, 0], position[:, 1], self.walkable, base
+            )
+            after = pathfinding.distances_to_wall(target[:, 0], target[:, 1], self.walkable, base)
+            allowed = on_map & ((after >= body_radius) | (after > before))
+            player[moving[allowed], axis] = target[allowed, axis]
+
+    def step(self, actions: Optional[np.ndarray] = None):
+        worlds = self.worlds
+        count = len(worlds)
+        npc_arrays = self.npc_arrays
+        npc_arrays["previous_x"][:] = npc_arrays["x"]
+        npc_arrays["previous_y"][:] = npc_arrays["y"]
+        if actions is not None:
+            self.move_players(np.asarray(actions, dtype=np.float64).reshape(count, 2))
+        self.ticks += 1
+
+        struck = np.array(
+            [
+                len(world.step_npcs(tuple(position)))
+                for world, position in zip(worlds, self.player.tolist())
+            ],
+            dtype=np.int64,
+        )
+        damage = np.minimum(struck * worlds[0].attack_damage, self.player_health)
+        self.player_health -= damage
+        self.episode_damage += damage
+
+        caught = self.player_health <= 0
+        dones = caught | (self.ticks >= self.max_ticks)
+        finished = np.flatnonzero(dones)
+        episodes = [
+            {
+                "world": index,
+                "seed": self.seeds[index],
+                "ticks": ticks,
+                "damage": damage,
+                "caught": was_caught,
+            }
+            for index, ticks, damage, was_caught in zip(
+                finished.tolist(),
+                self.ticks[finished].tolist(),
+                self.episode_damage[finished].tolist(),
+                caught[finished].tolist(),
+            )
+        ]
+        if len(finished):
+            self._reset_worlds(finished)
+        return self.observe(), dones, episodes
+
+    def observe(self) -> Dict[str, np.ndarray]:
+        shape = self.npc_shape
+        npc_positions = np.stack(
+            (self.npc_arrays["x"].reshape(shape), self.npc_arrays["y"].reshape(shape)), axis=-1
+        )
+        return {
+            "player": self.player.copy(),
+            "player_health": self.player_health.copy(),
+            "ticks": self.ticks.copy(),
+            "npc_positions": npc_positions,
+            "npc_states": self.npc_arrays["state"].reshape(shape).copy(),
+        }
+
+    def close(self):
+        for world in self.worlds:
+            world.shutdown()
+
+
+def _batch_worker(connection, seeds, max_ticks, simulation_options):
+    batch = WorldBatch(seeds, max_ticks, **simulation_options)
+    try:
+        while True:
+            command, payload = connection.recv()
+            if command == "step":
+                connection.send(batch.step(payload))
+            elif command == "reset":
+                connection.send(batch.reset())
+            elif command == "observe":
+                connection.send(batch.observe())
+            elif command == "parameters":
+                batch.set_parameters(**payload)
+                connection.send(None)
+            elif command == "close":
+                break
+    finally:
+        batch.close()
+        connection.close()
+
+
+class BatchEnvironment:
+    def __init__(
+        self,
+        worlds: int,
+        seed: int = 0,
+        max_ticks: int = 3600,
+        workers: int = 0,
+        **simulation_options,
+    ):
+        # workers=0 steps every world in this process; otherwise the worlds
+        # are split into one contiguous batch per worker process, and each
+        # step is one round trip per worker carrying only the action slice
+        # and the observation arrays.
+        self.worlds = worlds
+        seeds = [seed + index for index in range(worlds)]
+        self.episodes_completed = 0
+        self._local: Optional[WorldBatch] = None
+        self._connections: List = []
+        self._processes: List = []
+        self._bounds = [0, worlds]
+
+        if workers <= 0:
+            self._local = WorldBatch(seeds, max_ticks, **simulation_options)
+            return
+
+        workers = min(workers, worlds)
+        self._bounds = [worlds * worker // workers for worker in range(workers + 1)]
+        context = multiprocessing.get_context()
+        for worker in range(workers):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_batch_worker,
+                args=(
+                    child,
+                    seeds[self._bounds[worker] : self._bounds[worker + 1]],
+                    max_ticks,
+                    simulation_options,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def _broadcast(self, command: str, payloads=None) -> list:
+        for worker, connection in enumerate(self._connections):
+            connection.send((command, None if payloads is None else payloads[worker]))
+        return [connection.recv() for connection in self._connections]
+
+    def _split(self, values: Optional[np.ndarray]) -> Optional[list]:
+        if values is None:
+            return None
+        bounds = self._bounds
+        return [values[bounds[worker] : bounds[worker + 1]] for worker in range(len(bounds) - 1)]
+
+    @staticmethod
+    def _merge(observations: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        return {
+            name: np.concatenate([observation[name] for observation in observations])
+            for name in observations[0]
+        }
+
+    def set_parameters(self, **parameters):
+        if self._local is not None:
+            self._local.set_parameters(**parameters)
+            return
+        split = {
+            name: self._split(np.broadcast_to(np.asarray(value, dtype=np.float64), (self.worlds,)))
+            for name, value in parameters.items()
+        }
+        self._broadcast(
+            "parameters",
+            [
+                {name: values[worker] for name, values in split.items()}
+                for worker in range(len(self._connections))
+            ],
+        )
+
+    def reset(self) -> Dict[str, np.ndarray]:
+        if self._local is not None:
+            return self._local.reset()
+        return self._merge(self._broadcast("reset"))
+
+    def observe(self) -> Dict[str, np.ndarray]:
+        if self._local is not None:
+            return self._local.observe()
+        return self._merge(self._broadcast("observe"))
+
+    def step(self, actions: Optional[np.ndarray] = None):
+        if self._local is not None:
+            observation, dones, episodes = self._local.step(actions)
+        else:
+            results = self._broadcast("step", self._split(actions) or [None] * len(self._connections))
+            observation = self._merge([result[0] for result in results])
+            dones = np.concatenate([result[1] for result in results])
+            episodes = []
+            for worker, result in enumerate(results):
+                for episode in result[2]:
+                    episode["world"] += self._bounds[worker]
+                    episodes.append(episode)
+        self.episodes_completed += len(episodes)
+        return observation, dones, episodes
+
+    def close(self):
+        if self._local is not None:
+            self._local.close()
+            return
+        for connection in self._connections:
+            connection.send(("close", None))
+            connection.close()
+        for process in self._processes:
+            process.join()
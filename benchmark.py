@@ -0,0 +1,671 @@
+import argparse
+import hashlib
+import math
+import os
+import random
+import time
+
+import numpy as np
+
+from batch_env import BatchEnvironment
+from collision import SpatialHash, check_circle_collision
+from dstar import DStarLite
+from hierarchical import HierarchicalPathfinding
+from landmarks import LandmarkHeuristic
+from npc import NPC
+from npc_manager import NPCManager
+from npc_shards import ShardedNPCs
+from path_service import TimeSlicedPathService
+from pathfinding import ALGORITHMS, Pathfinding
+from replay import InputRecording, replay
+from simulation import InputCommand, Simulation
+
+
+def obstacle_layouts(count: int, seed: int):
+    for layout in range(count):
+        yield Simulation(seed=seed + layout).pathfinding
+
+
+def random_queries(pathfinding: Pathfinding, count: int, rng: random.Random):
+    cells = [
+        index
+        for index in range(pathfinding.size)
+        if pathfinding.walkable[index]
+    ]
+    queries = []
+    while len(queries) < count:
+        start, goal = rng.sample(cells, 2)
+        queries.append((start, goal))
+    return queries
+
+
+def copy_layout(layout: Pathfinding, **kwargs) -> Pathfinding:
+    pathfinding = Pathfinding(
+        layout.grid_width, layout.grid_height, layout.cell_size, **kwargs
+    )
+    for grid_x, grid_y in layout.obstacles:
+        pathfinding.add_obstacle(grid_x * layout.cell_size, grid_y * layout.cell_size)
+    return pathfinding
+
+
+def benchmark_jps(args):
+    rng = random.Random(args.seed)
+    totals = {algorithm: {"expanded": 0, "seconds": 0.0, "found": 0} for algorithm in ALGORITHMS}
+    query_count = 0
+
+    for layout in obstacle_layouts(args.layouts, args.seed):
+        queries = random_queries(layout, args.queries, rng)
+        query_count += len(queries)
+        for algorithm in ALGORITHMS:
+            pathfinding = copy_layout(layout, cache_size=0, algorithm=algorithm)
+            stats = totals[algorithm]
+            started = time.perf_counter()
+            for start, goal in queries:
+                if pathfinding.search(start, goal):
+                    stats["found"] += 1
+                stats["expanded"] += pathfinding.last_expanded
+            stats["seconds"] += time.perf_counter() - started
+
+    print(f"{args.layouts} layouts x {args.queries} queries ({query_count} searches)")
+    print(f"{'algorithm':<10} {'found':>8} {'expanded':>10} {'exp/query':>10} {'total ms':>10} {'us/query':>10}")
+    for algorithm, stats in totals.items():
+        print(
+            f"{algorithm:<10} {stats['found']:>8} {stats['expanded']:>10} "
+            f"{stats['expanded'] / query_count:>10.1f} {stats['seconds'] * 1000:>10.1f} "
+            f"{stats['seconds'] * 1e6 / query_count:>10.1f}"
+        )
+
+
+def random_map(size: int, density: float, rng: random.Random) -> Pathfinding:
+    pathfinding = Pathfinding(size, size, 1, cache_size=0)
+    for _ in range(int(size * size * density)):
+        pathfinding.add_obstacle(rng.randrange(size), rng.randrange(size))
+    return pathfinding
+
+
+def benchmark_hpa(args):
+    rng = random.Random(args.seed)
+    pathfinding = random_map(args.size, args.density, rng)
+    started = time.perf_counter()
+    hierarchical = HierarchicalPathfinding(pathfinding, args.cluster_size)
+    build_seconds = time.perf_counter() - started
+
+    cells = [index for index in range(pathfinding.size) if pathfinding.walkable[index]]
+    queries = [
+        (pathfinding.index_to_world(start), pathfinding.index_to_world(goal))
+        for start, goal in (rng.sample(cells, 2) for _ in range(args.queries))
+    ]
+
+    def run(planner):
+        expanded = 0
+        started = time.perf_counter()
+        for start_pos, goal_pos in queries:
+            planner.get_next_step(start_pos, goal_pos)
+            expanded += planner.last_expanded
+        return expanded / len(queries), (time.perf_counter() - started) * 1000 / len(queries)
+
+    print(f"{args.size}x{args.size} map, density {args.density}, {len(hierarchical.graph)} abstract nodes")
+    print(f"abstract graph build: {build_seconds * 1000:.1f} ms")
+    print(f"{'planner':<12} {'exp/query':>10} {'ms/query':>10}")
+    for name, planner in (
+        ("astar", pathfinding),
+        ("hpa (cold)", hierarchical),
+        ("hpa (warm)", hierarchical),
+    ):
+        expanded, milliseconds = run(planner)
+        print(f"{name:<12} {expanded:>10.1f} {milliseconds:>10.2f}")
+
+    # Local update: once every cluster is clean, an obstacle change must
+    # dirty only the clusters around it, queries starting in each of them
+    # must rebuild exactly those, and the repaired graph must equal one
+    # built from scratch.
+    hierarchical.rebuild_dirty()
+    cell = rng.choice(cells)
+    grid_x, grid_y = pathfinding.index_to_cell(cell)
+    goal_pos = queries[0][1]
+    rebuilds = hierarchical.cluster_rebuilds
+    started = time.perf_counter()
+    pathfinding.add_obstacle(grid_x, grid_y)
+    touched = hierarchical.dirty_clusters
+    starts = []
+    for cluster in sorted(touched):
+        x0, y0, x1, y1 = hierarchical.cluster_bounds(cluster)
+        start = next(
+            (
+                pathfinding.cell_index(x, y)
+                for y in range(y0, y1)
+                for x in range(x0, x1)
+                if pathfinding.is_walkable(x, y)
+            ),
+            None,
+        )
+        if start is not None:
+            starts.append(pathfinding.index_to_world(start))
+            hierarchical.get_next_step(starts[-1], goal_pos)
+    update_seconds = time.perf_counter() - started
+    rebuilt = hierarchical.cluster_rebuilds - rebuilds
+    assert rebuilt == len(touched), f"{rebuilt} clusters rebuilt, {len(touched)} touched"
+    assert hierarchical.rebuild_dirty() == 0, "clusters left dirty after the update"
+
+    fresh = HierarchicalPathfinding(pathfinding, args.cluster_size)
+    fresh.rebuild_dirty()
+    assert hierarchical.graph == fresh.graph, "locally repaired graph differs from a fresh build"
+    print(
+        f"obstacle update + queries from {len(starts)} clusters: {update_seconds * 1000:.2f} ms, "
+        f"{rebuilt} of {len(hierarchical.cluster_nodes)} clusters rebuilt "
+        f"(touched {sorted(touched)}), matches fresh build"
+    )
+
+
+def room_map(size: int, room: int, rng: random.Random) -> Pathfinding:
+    pathfinding = Pathfinding(size, size, 1, cache_size=0)
+    for wall in range(room, size, room):
+        for cell in range(size):
+            pathfinding.add_obstacle(wall, cell)
+            pathfinding.add_obstacle(cell, wall)
+    for wall in range(room, size, room):
+        for offset in range(0, size, room):
+            door = offset + rng.randrange(1, room - 2)
+            if rng.random() < 0.6:
+                pathfinding.remove_obstacle(wall, door)
+                pathfinding.remove_obstacle(wall, door + 1)
+            door = offset + rng.randrange(1, room - 2)
+            if rng.random() < 0.6:
+                pathfinding.remove_obstacle(door, wall)
+                pathfinding.remove_obstacle(door + 1, wall)
+    return pathfinding
+
+
+def path_cost(pathfinding: Pathfinding, path) -> int:
+    straight = (1, pathfinding.stride)
+    return sum(
+        10 if abs(second - first) in straight else 14
+        for first, second in zip(path, path[1:])
+    )
+
+
+def benchmark_alt(args):
+    rng = random.Random(args.seed)
+    maps = (
+        ("random", random_map(args.size, args.density, rng)),
+        ("rooms", room_map(args.size, args.room_size, rng)),
+    )
+
+    print(f"{args.size}x{args.size} maps, {args.queries} queries, {args.landmarks} landmarks")
+    print(f"{'map':<8} {'heuristic':<10} {'build ms':>9} {'exp/query':>10} {'ms/query':>9} {'path cost':>10}")
+    for map_name, pathfinding in maps:
+        cells = [index for index in range(pathfinding.size) if pathfinding.walkable[index]]
+        queries = [tuple(rng.sample(cells, 2)) for _ in range(args.queries)]
+        for name, count in (("manhattan", None), ("octile", 0), ("alt", args.landmarks)):
+            build_seconds = 0.0
+            pathfinding.landmarks = None
+            if count is not None:
+                started = time.perf_counter()
+                pathfinding.landmarks = LandmarkHeuristic(pathfinding, count)
+                pathfinding.landmarks.refresh()
+                build_seconds = time.perf_counter() - started
+
+            expanded = 0
+            cost = 0
+            started = time.perf_counter()
+            for start, goal in queries:
+                cost += path_cost(pathfinding, pathfinding.astar_search(start, goal))
+                expanded += pathfinding.last_expanded
+            seconds = time.perf_counter() - started
+            print(
+                f"{map_name:<8} {name:<10} {build_seconds * 1000:>9.1f} "
+                f"{expanded / len(queries):>10.1f} {seconds * 1000 / len(queries):>9.2f} {cost:>10}"
+            )
+
+
+def benchmark_dstar(args):
+    rng = random.Random(args.seed)
+    totals = {"incremental": [], "fresh d* lite": [], "fresh a*": []}
+
+    for layout in obstacle_layouts(args.layouts, args.seed):
+        pathfinding = copy_layout(layout, cache_size=0)
+        planner = DStarLite(pathfinding)
+        cells = [index for index in range(pathfinding.size) if pathfinding.walkable[index]]
+        npc = list(pathfinding.index_to_world(rng.choice(cells)))
+        player = list(pathfinding.index_to_world(rng.choice(cells)))
+        heading = (0, 0)
+
+        for frame in range(args.frames):
+            if frame % 30 == 0:
+                heading = rng.choice([(dx, dy) for dx in (-4, 0, 4) for dy in (-4, 0, 4)])
+            moved = (player[0] + heading[0], player[1] + heading[1])
+            if pathfinding.world_to_index(moved) in cells:
+                player[:] = moved
+
+            start_pos = (int(npc[0]), int(npc[1]))
+            goal_pos = tuple(player)
+            step = planner.get_next_step(start_pos, goal_pos)
+            totals["incremental"].append(planner.last_expanded)
+
+            fresh = DStarLite(pathfinding)
+            fresh.get_next_step(start_pos, goal_pos)
+            totals["fresh d* lite"].append(fresh.last_expanded)
+            fresh.detach()
+
+            endpoints = pathfinding.resolve_endpoints(start_pos, goal_pos)
+            if endpoints and endpoints[0] != endpoints[1]:
+                pathfinding.search(*endpoints)
+                totals["fresh a*"].append(pathfinding.last_expanded)
+            else:
+                totals["fresh a*"].append(0)
+
+            if step:
+                dx, dy = step[0] - npc[0], step[1] - npc[1]
+                length = max((dx * dx + dy * dy) ** 0.5, 1e-9)
+                npc[0] += dx / length * min(4.5, length)
+                npc[1] += dy / length * min(4.5, length)
+
+    frames = len(totals["incremental"])
+    print(f"{args.layouts} layouts x {args.frames} frames of a moving-target chase")
+    print(f"{'planner':<14} {'mean/frame':>10} {'max/frame':>10} {'idle frames':>12}")
+    for name, expanded in totals.items():
+        idle = sum(1 for count in expanded if count == 0)
+        print(f"{name:<14} {sum(expanded) / frames:>10.1f} {max(expanded):>10} {idle:>12}")
+
+
+def benchmark_npcs(args):
+    rng = random.Random(args.seed)
+    pathfinding = Pathfinding(30, 20, 40)
+    spawns = [(rng.uniform(0, 1200), rng.uniform(0, 800)) for _ in range(args.npcs)]
+    managers = (NPCManager(args.npcs), NPCManager(args.npcs))
+    for manager in managers:
+        for x, y in spawns:
+            NPC(x, y, pathfinding, manager=manager)
+    vectorized, per_object = managers
+
+    timings = {"vectorized": 0.0, "per-object": 0.0}
+    mismatches = 0
+    for frame in range(args.frames):
+        player_pos = (600 + 400 * math.sin(frame / 40), 400 + 300 * math.cos(frame / 55))
+        drift = [(rng.uniform(-6, 6), rng.uniform(-6, 6)) for _ in range(args.npcs)]
+        for manager in managers:
+            for slot, (dx, dy) in enumerate(drift):
+                manager.x[slot] += dx
+                manager.y[slot] += dy
+
+        started = time.perf_counter()
+        vectorized.tick_cooldowns()
+        vectorized.update_states(player_pos)
+        timings["vectorized"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        for npc in per_object.views:
+            if npc.attack_cooldown > 0:
+                npc.attack_cooldown -= 1
+            npc.fsm.check_transitions(npc.tick_context(player_pos))
+        timings["per-object"] += time.perf_counter() - started
+
+        mismatches += int((vectorized.state != per_object.state).sum())
+
+    print(f"{args.npcs} NPCs x {args.frames} frames of state transitions")
+    print(f"{'update':<12} {'ms/frame':>10}")
+    for name, seconds in timings.items():
+        print(f"{name:<12} {seconds * 1000 / args.frames:>10.3f}")
+    print(f"state mismatches: {mismatches}")
+
+
+def benchmark_crowd(args):
+    rng = random.Random(args.seed)
+    radius = 40
+    circles = [
+        (rng.uniform(0, args.world), rng.uniform(0, args.world)) for _ in range(args.npcs)
+    ]
+
+    def brute_force():
+        return sum(
+            1
+            for index, pos in enumerate(circles)
+            for other_index, other in enumerate(circles)
+            if index != other_index and check_circle_collision(pos, radius, other, radius)
+        )
+
+    spatial_hash = SpatialHash(args.bucket_size)
+
+    def hashed():
+        for index, pos in enumerate(circles):
+            spatial_hash.insert(index, pos, radius)
+        return sum(
+            1
+            for index, pos in enumerate(circles)
+            for other_index in spatial_hash.nearby(pos, radius + spatial_hash.max_radius)
+            if index != other_index
+            and check_circle_collision(pos, radius, circles[other_index], radius)
+        )
+
+    print(f"{args.npcs} NPCs on a {args.world}x{args.world} world, bucket {args.bucket_size}")
+    print(f"{'broadphase':<12} {'contacts':>9} {'ms/frame':>10}")
+    for name, run in (("brute force", brute_force), ("hash (cold)", hashed), ("hash (warm)", hashed)):
+        started = time.perf_counter()
+        contacts = run()
+        print(f"{name:<12} {contacts:>9} {(time.perf_counter() - started) * 1000:>10.1f}")
+
+
+def benchmark_headless(args):
+    rng = random.Random(args.seed)
+    simulation = Simulation(seed=args.seed)
+    command = InputCommand()
+    started = time.perf_counter()
+    for tick in range(args.ticks):
+        if tick % 30 == 0:
+            command = InputCommand(rng.randint(-1, 1), rng.randint(-1, 1))
+        simulation.step(command)
+        if simulation.player_dead:
+            simulation.reset()
+    seconds = time.perf_counter() - started
+    simulation.shutdown()
+
+    simulated = args.ticks / simulation.tick_rate
+    print(f"{args.ticks} ticks ({simulated:.1f} s of game time) in {seconds:.2f} s")
+    print(f"{args.ticks / seconds:.0f} ticks/s, {simulated / seconds:.1f}x real time")
+    print(f"{'state':<8} {'handler calls':>14} {'total ms':>9} {'us/call':>8}")
+    for state, (calls, handler_seconds) in simulation.npc_manager.handler_times().items():
+        print(
+            f"{state.name:<8} {calls:>14} {handler_seconds * 1000:>9.1f} "
+            f"{handler_seconds * 1e6 / max(calls, 1):>8.1f}"
+        )
+
+
+def benchmark_batch(args):
+    rng = np.random.default_rng(args.seed)
+    print(f"{args.worlds} worlds, episodes capped at {args.max_ticks} ticks, {args.ticks} batch steps")
+    print(f"{'workers':>7} {'episodes':>9} {'episodes/s':>11} {'world ticks/s':>14}")
+    for workers in args.workers:
+        environment = BatchEnvironment(
+            args.worlds, seed=args.seed, max_ticks=args.max_ticks, workers=workers
+        )
+        environment.reset()
+        actions = rng.integers(-1, 2, size=(args.worlds, 2))
+        started = time.perf_counter()
+        for tick in range(args.ticks):
+            if tick % 30 == 0:
+                actions = rng.integers(-1, 2, size=(args.worlds, 2))
+            environment.step(actions)
+        seconds = time.perf_counter() - started
+        environment.close()
+        print(
+            f"{workers:>7} {environment.episodes_completed:>9} "
+            f"{environment.episodes_completed / seconds:>11.1f} "
+            f"{args.worlds * args.ticks / seconds:>14.0f}"
+        )
+
+
+def benchmark_lod(args):
+    # The shared chase flow field is rebuilt whenever the player changes
+    # cell, whichever scheduler runs, so the NPC update is also timed on its
+    # own. The distance transform is built up front so the first tick does
+    # not carry it.
+    print(f"{args.npcs} NPCs on a {args.size}x{args.size} cell map, {args.ticks} ticks")
+    print(
+        f"{'scheduler':<10} {'npc ms':>7} {'stdev':>7} {'p95':>7} "
+        f"{'frame ms':>9} {'stdev':>7} {'max':>7} {'handlers/tick':>14}"
+    )
+    for lod_enabled in (False, True):
+        rng = random.Random(args.seed)
+        cell_size = 40
+        layout = Pathfinding(args.size, args.size, cell_size)
+        for _ in range(int(args.size * args.size * args.density)):
+            layout.add_obstacle(rng.randrange(args.size) * cell_size, rng.randrange(args.size) * cell_size)
+        path_service = TimeSlicedPathService(layout)
+        manager = NPCManager(args.npcs)
+        manager.lod_enabled = lod_enabled
+        cells = [index for index in range(layout.size) if layout.walkable[index]]
+        for index in rng.sample(cells, args.npcs):
+            NPC(*layout.index_to_world(index), layout, path_service=path_service, manager=manager)
+        layout.clearance(cells[0])
+
+        world = args.size * cell_size
+        frames = []
+        updates = []
+        handlers = 0
+        for tick in range(args.ticks):
+            player_pos = (
+                world / 2 + world / 3 * math.sin(tick / 90),
+                world / 2 + world / 3 * math.cos(tick / 120),
+            )
+            started = time.perf_counter()
+            manager.save_previous()
+            layout.update_flow_field(player_pos)
+            updating = time.perf_counter()
+            manager.update(player_pos)
+            path_service.update()
+            finished = time.perf_counter()
+            frames.append(finished - started)
+            updates.append(finished - updating)
+            handlers += manager.last_updated
+
+        def spread(timings):
+            mean = sum(timings) / len(timings)
+            stdev = (sum((timing - mean) ** 2 for timing in timings) / len(timings)) ** 0.5
+            return mean * 1000, stdev * 1000
+
+        update_mean, update_stdev = spread(updates)
+        frame_mean, frame_stdev = spread(frames)
+        updates.sort()
+        print(
+            f"{'lod' if lod_enabled else 'full':<10} {update_mean:>7.2f} {update_stdev:>7.2f} "
+            f"{updates[int(len(updates) * 0.95)] * 1000:>7.2f} {frame_mean:>9.2f} "
+            f"{frame_stdev:>7.2f} {max(frames) * 1000:>7.2f} {handlers / args.ticks:>14.1f}"
+        )
+
+
+def benchmark_perception(args):
+    print(f"{args.npcs} NPCs on a {args.size}x{args.size} cell map, {args.ticks} ticks")
+    print(f"{'player':<8} {'perception':<11} {'ms/tick':>8} {'p95':>7} {'guards/tick':>12}")
+    world = args.size * 40
+    players = {
+        "idle": lambda tick: (world / 2, world / 2),
+        "moving": lambda tick: (
+            world / 2 + world / 3 * math.sin(tick / 90),
+            world / 2 + world / 3 * math.cos(tick / 120),
+        ),
+    }
+    for player, player_pos in players.items():
+        for perception_enabled in (False, True):
+            rng = random.Random(args.seed)
+            cell_size = 40
+            layout = Pathfinding(args.size, args.size, cell_size)
+            for _ in range(int(args.size * args.size * args.density)):
+                layout.add_obstacle(rng.randrange(args.size) * cell_size, rng.randrange(args.size) * cell_size)
+            path_service = TimeSlicedPathService(layout)
+            manager = NPCManager(args.npcs)
+            manager.perception_enabled = perception_enabled
+            cells = [index for index in range(layout.size) if layout.walkable[index]]
+            for index in rng.sample(cells, args.npcs):
+                NPC(*layout.index_to_world(index), layout, path_service=path_service, manager=manager)
+
+            timings = []
+            guards = 0
+            for tick in range(args.ticks):
+                started = time.perf_counter()
+                manager.save_previous()
+                layout.update_flow_field(player_pos(tick))
+                manager.update(player_pos(tick))
+                path_service.update()
+                timings.append(time.perf_counter() - started)
+                guards += manager.last_perceived
+
+            timings.sort()
+            print(
+                f"{player:<8} {'events' if perception_enabled else 'polling':<11} "
+                f"{sum(timings) / len(timings) * 1000:>8.2f} "
+                f"{timings[int(len(timings) * 0.95)] * 1000:>7.2f} {guards / args.ticks:>12.1f}"
+            )
+
+
+def benchmark_shards(args):
+    rng = random.Random(args.seed)
+    cell_size = 40
+    layout = Pathfinding(args.size, args.size, cell_size)
+    for _ in range(int(args.size * args.size * args.density)):
+        layout.add_obstacle(rng.randrange(args.size) * cell_size, rng.randrange(args.size) * cell_size)
+    cells = [index for index in range(layout.size) if layout.walkable[index]]
+    spawns = [layout.index_to_world(index) for index in rng.sample(cells, args.npcs)]
+    world = args.size * cell_size
+
+    print(f"{args.npcs} NPCs on a {args.size}x{args.size} cell map, {args.ticks} ticks")
+    print(f"{'workers':>7} {'ms/tick':>8} {'p95':>7} {'ticks/s':>8}  state hash")
+    for workers in args.workers:
+        if workers:
+            shards = ShardedNPCs(layout, spawns, workers)
+            manager = shards.manager
+        else:
+            path_service = TimeSlicedPathService(layout)
+            manager = NPCManager(args.npcs)
+            for x, y in spawns:
+                NPC(x, y, layout, path_service=path_service, manager=manager)
+        timings = []
+        for tick in range(args.ticks):
+            player_pos = (
+                world / 2 + world / 3 * math.sin(tick / 90),
+                world / 2 + world / 3 * math.cos(tick / 120),
+            )
+            started = time.perf_counter()
+            manager.save_previous()
+            if workers:
+                shards.step(player_pos)
+            else:
+                layout.update_flow_field(player_pos)
+                manager.update(player_pos)
+                path_service.update()
+            timings.append(time.perf_counter() - started)
+        digest = hashlib.blake2b(digest_size=8)
+        for name in ("x", "y", "state"):
+            digest.update(getattr(manager, name)[: manager.count].tobytes())
+        if workers:
+            shards.close()
+        else:
+            path_service.shutdown()
+        timings.sort()
+        mean = sum(timings) / len(timings)
+        print(
+            f"{workers:>7} {mean * 1000:>8.2f} {timings[int(len(timings) * 0.95)] * 1000:>7.2f} "
+            f"{len(timings) / sum(timings):>8.0f}  {digest.hexdigest()}"
+        )
+
+
+def benchmark_replay(args):
+    recording = InputRecording.load(args.recording)
+    print(f"{args.recording}: seed {recording.seed}, {len(recording)} ticks at {recording.tick_rate} Hz")
+    print(f"{'run':>3} {'total ms':>9} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7} {'ticks/s':>8}  state hash")
+    hashes = set()
+    for run in range(args.repeat):
+        result = replay(recording)
+        stats = result.get_stats()
+        hashes.add(result.state_hash)
+        print(
+            f"{run:>3} {stats['total_ms']:>9.1f} {stats['mean_ms']:>8.3f} {stats['p50_ms']:>7.3f} "
+            f"{stats['p95_ms']:>7.3f} {stats['max_ms']:>7.3f} {stats['ticks_per_second']:>8.0f}  "
+            f"{result.state_hash}"
+        )
+        if args.timings and run == 0:
+            with open(args.timings, "w") as handle:
+                handle.write("tick,ms\n")
+                for tick, seconds in enumerate(result.tick_seconds):
+                    handle.write(f"{tick},{seconds * 1000:.4f}\n")
+    if len(hashes) > 1:
+        raise SystemExit("replays diverged: the simulation is not deterministic")
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Neural Pursuit benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    jps = commands.add_parser("jps", help="A* vs Jump Point Search on game layouts")
+    jps.add_argument("--layouts", type=int, default=50)
+    jps.add_argument("--queries", type=int, default=200)
+    jps.add_argument("--seed", type=int, default=0)
+    jps.set_defaults(run=benchmark_jps)
+
+    hpa = commands.add_parser("hpa", help="Flat A* vs hierarchical A* on a large map")
+    hpa.add_argument("--size", type=int, default=1000)
+    hpa.add_argument("--density", type=float, default=0.1)
+    hpa.add_argument("--cluster-size", type=int, default=16)
+    hpa.add_argument("--queries", type=int, default=20)
+    hpa.add_argument("--seed", type=int, default=0)
+    hpa.set_defaults(run=benchmark_hpa)
+
+    alt = commands.add_parser("alt", help="Landmark (ALT) heuristic vs plain A* heuristics")
+    alt.add_argument("--size", type=int, default=200)
+    alt.add_argument("--density", type=float, default=0.2)
+    alt.add_argument("--room-size", type=int, default=20)
+    alt.add_argument("--landmarks", type=int, default=16)
+    alt.add_argument("--queries", type=int, default=100)
+    alt.add_argument("--seed", type=int, default=0)
+    alt.set_defaults(run=benchmark_alt)
+
+    dstar = commands.add_parser("dstar", help="Per-frame expansions of D* Lite vs full replans")
+    dstar.add_argument("--layouts", type=int, default=20)
+    dstar.add_argument("--frames", type=int, default=600)
+    dstar.add_argument("--seed", type=int, default=0)
+    dstar.set_defaults(run=benchmark_dstar)
+
+    npcs = commands.add_parser("npcs", help="Vectorized vs per-object NPC state transitions")
+    npcs.add_argument("--npcs", type=int, default=10000)
+    npcs.add_argument("--frames", type=int, default=100)
+    npcs.add_argument("--seed", type=int, default=0)
+    npcs.set_defaults(run=benchmark_npcs)
+
+    crowd = commands.add_parser("crowd", help="Brute-force vs spatial-hash NPC collision checks")
+    crowd.add_argument("--npcs", type=int, default=2000)
+    crowd.add_argument("--world", type=int, default=4000)
+    crowd.add_argument("--bucket-size", type=float, default=96)
+    crowd.add_argument("--seed", type=int, default=0)
+    crowd.set_defaults(run=benchmark_crowd)
+
+    headless = commands.add_parser("headless", help="Uncapped tick rate of the display-free simulation")
+    headless.add_argument("--ticks", type=int, default=3600)
+    headless.add_argument("--seed", type=int, default=0)
+    headless.set_defaults(run=benchmark_headless)
+
+    batch = commands.add_parser("batch", help="Episodes per second of the batched environment")
+    batch.add_argument("--worlds", type=int, default=16)
+    batch.add_argument("--ticks", type=int, default=1200)
+    batch.add_argument("--max-ticks", type=int, default=600)
+    batch.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1])
+    batch.add_argument("--seed", type=int, default=0)
+    batch.set_defaults(run=benchmark_batch)
+
+    lod = commands.add_parser("lod", help="Full per-tick NPC updates vs distance-based LOD scheduling")
+    lod.add_argument("--npcs", type=int, default=300)
+    lod.add_argument("--size", type=int, default=100)
+    lod.add_argument("--density", type=float, default=0.05)
+    lod.add_argument("--ticks", type=int, default=300)
+    lod.add_argument("--seed", type=int, default=0)
+    lod.set_defaults(run=benchmark_lod)
+
+    perception = commands.add_parser("perception", help="Per-tick guard polling vs event-driven perception")
+    perception.add_argument("--npcs", type=int, default=2000)
+    perception.add_argument("--size", type=int, default=150)
+    perception.add_argument("--density", type=float, default=0.05)
+    perception.add_argument("--ticks", type=int, default=300)
+    perception.add_argument("--seed", type=int, default=0)
+    perception.set_defaults(run=benchmark_perception)
+
+    shards = commands.add_parser("shards", help="NPCs stepped in-process vs sharded over worker processes")
+    shards.add_argument("--npcs", type=int, default=2000)
+    shards.add_argument("--size", type=int, default=150)
+    shards.add_argument("--density", type=float, default=0.05)
+    shards.add_argument("--ticks", type=int, default=200)
+    shards.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    shards.add_argument("--seed", type=int, default=0)
+    shards.set_defaults(run=benchmark_shards)
+
+    replay_parser = commands.add_parser("replay", help="Headless replay of a recorded session")
+    replay_parser.add_argument("recording", help="file written by main.py --record")
+    replay_parser.add_argument("--repeat", type=int, default=3)
+    replay_parser.add_argument("--timings", metavar="CSV", help="write per-tick timings of the first run")
+    replay_parser.set_defaults(run=benchmark_replay)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,3 +29,87 @@ def check_point_in_obstacle(pos, grid_x, grid_y, cell_size, pathfinding):
     grid_pos_x = pos[0] // cell_size
     grid_pos_y = pos[1] // cell_size
     return not pathfinding.is_walkable(grid_pos_x, grid_pos_y)
+
+
+class SpatialHash:
+    def __init__(self, cell_size: float = 96):
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.positions = {}
+        self.cells = {}
+        self.max_radius = 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def _cell(self, pos):
+        return (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+
+    def clear(self):
+        self.buckets.clear()
+        self.positions.clear()
+        self.cells.clear()
+
+    def insert(self, item, pos, radius: float = 0):
+        if item in self.positions:
+            self.move(item, pos)
+            return
+        cell = self._cell(pos)
+        self.buckets.setdefault(cell, []).append(item)
+        self.positions[item] = pos
+        self.cells[item] = cell
+        if radius > self.max_radius:
+            self.max_radius = radius
+
+    def remove(self, item):
+        cell = self.cells.pop(item, None)
+        if cell is None:
+            return
+        del self.positions[item]
+        bucket = self.buckets[cell]
+        bucket.remove(item)
+        if not bucket:
+            del self.buckets[cell]
+
+    def move(self, item, pos):
+        # Only items that cross a bucket boundary touch the bucket lists.
+        self.positions[item] = pos
+        cell = self._cell(pos)
+        previous = self.cells[item]
+        if cell == previous:
+            return
+        bucket = self.buckets[previous]
+        bucket.remove(item)
+        if not bucket:
+            del self.buckets[previous]
+        self.buckets.setdefault(cell, []).append(item)
+        self.cells[item] = cell
+
+    def nearby(self, pos, radius: float):
+        # Broadphase only: every item in a bucket overlapping the query's
+        # bounding box, without a distance test.
+        min_x, min_y = self._cell((pos[0] - radius, pos[1] - radius))
+        max_x, max_y = self._cell((pos[0] + radius, pos[1] + radius))
+        buckets = self.buckets
+        found = []
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                bucket = buckets.get((cell_x, cell_y))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def query_radius(self, pos, radius: float):
+        positions = self.positions
+        limit = radius * radius
+        found = []
+        for item in self.nearby(pos, radius):
+            other = positions[item]
+            dx = other[0] - pos[0]
+            dy = other[1] - pos[1]
+            if dx * dx + dy * dy <= limit:
+                found.append(item)
+        return found
@@ -0,0 +1,181 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+from pathfinding import FLOW_UNREACHABLE, Pathfinding
+
+INFINITY = FLOW_UNREACHABLE
+
+
+class DStarLite:
+    def __init__(self, pathfinding: Pathfinding):
+        self.pathfinding = pathfinding
+        self.start: Optional[int] = None
+        self.goal: Optional[int] = None
+        self.g: Dict[int, int] = {}
+        self.rhs: Dict[int, int] = {}
+        self.open_set: List[Tuple[int, int, int]] = []
+        self._open_keys: Dict[int, Tuple[int, int]] = {}
+        self._key_modifier = 0
+        self._last_start: Optional[int] = None
+        self._changed_cells: List[int] = []
+        self.last_expanded = 0
+        self.total_expanded = 0
+        self.full_replans = 0
+        pathfinding.add_obstacle_listener(self._on_obstacle_changed)
+
+    def _on_obstacle_changed(self, index: int):
+        self._changed_cells.append(index)
+
+    def detach(self):
+        self.pathfinding.remove_obstacle_listener(self._on_obstacle_changed)
+
+    def reset(self):
+        self.start = None
+        self.goal = None
+        self.g.clear()
+        self.rhs.clear()
+        self.open_set.clear()
+        self._open_keys.clear()
+        self._changed_cells.clear()
+        self._key_modifier = 0
+
+    def heuristic(self, index: int, other: int) -> int:
+        cell_x = self.pathfinding.cell_x
+        cell_y = self.pathfinding.cell_y
+        dx = abs(cell_x[index] - cell_x[other])
+        dy = abs(cell_y[index] - cell_y[other])
+        return 10 * max(dx, dy) + 4 * min(dx, dy)
+
+    def _calculate_key(self, index: int) -> Tuple[int, int]:
+        best = min(self.g.get(index, INFINITY), self.rhs.get(index, INFINITY))
+        return best + self.heuristic(self.start, index) + self._key_modifier, best
+
+    def _update_vertex(self, index: int):
+        walkable = self.pathfinding.walkable
+        if index != self.goal:
+            best = INFINITY
+            if walkable[index]:
+                g = self.g
+                for offset, cost in self.pathfinding.neighbor_offsets:
+                    neighbor = index + offset
+                    if walkable[neighbor]:
+                        candidate = cost + g.get(neighbor, INFINITY)
+                        if candidate < best:
+                            best = candidate
+            self.rhs[index] = best
+
+        self._open_keys.pop(index, None)
+        if self.g.get(index, INFINITY) != self.rhs.get(index, INFINITY):
+            key = self._calculate_key(index)
+            self._open_keys[index] = key
+            heapq.heappush(self.open_set, (key[0], key[1], index))
+
+    def _update_neighbors(self, index: int):
+        walkable = self.pathfinding.walkable
+        for offset, _ in self.pathfinding.neighbor_offsets:
+            neighbor = index + offset
+            if walkable[neighbor]:
+                self._update_vertex(neighbor)
+
+    def _top_key(self) -> Optional[Tuple[int, int]]:
+        open_set = self.open_set
+        while open_set:
+            k1, k2, index = open_set[0]
+            if self._open_keys.get(index) == (k1, k2):
+                return k1, k2
+            heapq.heappop(open_set)
+        return None
+
+    def _compute_shortest_path(self):
+        g = self.g
+        rhs = self.rhs
+        expanded = 0
+        while True:
+            top = self._top_key()
+            start_key = self._calculate_key(self.start)
+            if top is None or (
+                top >= start_key
+                and rhs.get(self.start, INFINITY) == g.get(self.start, INFINITY)
+            ):
+                break
+
+            _, _, index = heapq.heappop(self.open_set)
+            new_key = self._calculate_key(index)
+            if top < new_key:
+                self._open_keys[index] = new_key
+                heapq.heappush(self.open_set, (new_key[0], new_key[1], index))
+                continue
+
+            expanded += 1
+            del self._open_keys[index]
+            if g.get(index, INFINITY) > rhs.get(index, INFINITY):
+                g[index] = rhs[index]
+            else:
+                g[index] = INFINITY
+                self._update_vertex(index)
+            self._update_neighbors(index)
+
+        self.last_expanded += expanded
+        self.total_expanded += expanded
+
+    def _plan(self, start: int, goal: int):
+        if self.goal is None:
+            self.reset()
+            self.start = start
+            self.goal = goal
+            self._last_start = start
+            self.rhs[goal] = 0
+            self._update_vertex(goal)
+            self.full_replans += 1
+            return
+
+        if start != self.start:
+            self._key_modifier += self.heuristic(self._last_start, start)
+            self._last_start = start
+            self.start = start
+
+        # The goal is just a vertex whose rhs is pinned to zero, so a moving
+        # target only needs its old and new cells repaired.
+        if goal != self.goal:
+            previous_goal = self.goal
+            self.goal = goal
+            self.rhs[goal] = 0
+            self._update_vertex(goal)
+            self._update_vertex(previous_goal)
+
+        changed = self._changed_cells[:]
+        self._changed_cells.clear()
+        for index in changed:
+            self._update_vertex(index)
+            self._update_neighbors(index)
+
+    def get_next_step(
+        self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int]
+    ) -> Optional[Tuple[int, int]]:
+        pathfinding = self.pathfinding
+        self.last_expanded = 0
+        endpoints = pathfinding.resolve_endpoints(start_pos, goal_pos)
+        if endpoints is None:
+            return None
+        start, goal = endpoints
+        if start == goal:
+            return goal_pos
+        if not pathfinding.walkable[start]:
+            return pathfinding.get_next_step(start_pos, goal_pos)
+
+        self._plan(start, goal)
+        self._compute_shortest_path()
+
+        walkable = pathfinding.walkable
+        best = None
+        best_cost = INFINITY
+        for offset, cost in pathfinding.neighbor_offsets:
+            neighbor = start + offset
+            if walkable[neighbor]:
+                candidate = cost + self.g.get(neighbor, INFINITY)
+                if candidate < best_cost:
+                    best = neighbor
+                    best_cost = candidate
+        if best is None:
+            return None
+        return pathfinding.index_to_world(best)
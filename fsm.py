@@ -1,5 +1,6 @@
+import time
 from enum import Enum
-from typing import Callable, Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, List, Tuple
 
 
 class State(Enum):
@@ -16,6 +17,11 @@ class FSM:
         self.state_handlers: Dict[State, Callable] = {}
         self.transitions: Dict[State, Dict[State, Callable]] = {}
         self.state_data: Dict[State, Any] = {}
+        self.enter_hooks: Dict[State, List[Callable]] = {}
+        self.exit_hooks: Dict[State, List[Callable]] = {}
+        self.handler_seconds: Dict[State, float] = {state: 0.0 for state in State}
+        self.handler_calls: Dict[State, int] = {state: 0 for state in State}
+        self._table: Optional[Dict[State, Tuple[Tuple[Callable, State], ...]]] = None
 
     def add_state_handler(self, state: State, handler: Callable):
         self.state_handlers[state] = handler
@@ -24,21 +30,62 @@ class FSM:
         if from_state not in self.transitions:
             self.transitions[from_state] = {}
         self.transitions[from_state][to_state] = condition
+        self._table = None
 
-    def update(self, *args, **kwargs):
-        if self.current_state in self.state_handlers:
-            self.state_handlers[self.current_state](*args, **kwargs)
+    def add_enter_hook(self, state: State, hook: Callable):
+        self.enter_hooks.setdefault(state, []).append(hook)
 
-        if self.current_state in self.transitions:
-            for next_state, condition in self.transitions[self.current_state].items():
-                if condition(*args, **kwargs):
-                    self.change_state(next_state)
-                    break
+    def add_exit_hook(self, state: State, hook: Callable):
+        self.exit_hooks.setdefault(state, []).append(hook)
+
+    def compile(self) -> Dict[State, Tuple[Tuple[Callable, State], ...]]:
+        # One row per state holding its (guard, target) pairs in priority
+        # order, so a tick walks a tuple instead of nested dict views.
+        self._table = {
+            state: tuple(
+                (condition, target)
+                for target, condition in self.transitions.get(state, {}).items()
+            )
+            for state in State
+        }
+        return self._table
+
+    def update(self, context, *args, **kwargs):
+        result = self.handle(*args, **kwargs)
+        self.check_transitions(context)
+        return result
+
+    def handle(self, *args, **kwargs):
+        state = self.current_state
+        handler = self.state_handlers.get(state)
+        if handler is None:
+            return None
+        started = time.perf_counter()
+        result = handler(*args, **kwargs)
+        self.handler_seconds[state] += time.perf_counter() - started
+        self.handler_calls[state] += 1
+        return result
+
+    def check_transitions(self, context) -> bool:
+        table = self._table or self.compile()
+        for guard, target in table[self.current_state]:
+            if guard(context):
+                self.change_state(target)
+                return True
+        return False
 
     def change_state(self, new_state: State):
         if new_state != self.current_state:
-            self.previous_state = self.current_state
+            previous_state = self.current_state
+            self.previous_state = previous_state
             self.current_state = new_state
+            self.fire_hooks(previous_state, new_state)
+
+    def fire_hooks(self, previous_state: State, new_state: State):
+        for hook in self.exit_hooks.get(previous_state, ()):
+            hook(previous_state, new_state)
+        for hook in self.enter_hooks.get(new_state, ()):
+            hook(previous_state, new_state)
 
     def get_state(self) -> State:
         return self.current_state
@@ -1,19 +1,36 @@
 import pygame
 import random
-from pathfinding import Pathfinding
-from npc import NPC
-from fsm import State
+from typing import Optional
+from simulation import IDLE, InputCommand, Simulation
+from replay import InputRecording
 from graphics import Graphics
+from telemetry import LATENCY_BUCKETS_MS
 from sprites_manager import SpritesManager
 
 GAME_NAME = "Neural Pursuit"
 
 
 class Game:
-    def __init__(self, width: int = 1200, height: int = 800):
+    def __init__(
+        self,
+        width: int = 1200,
+        height: int = 800,
+        tick_rate: int = 60,
+        max_fps: int = 120,
+        seed: Optional[int] = None,
+        record_path: Optional[str] = None,
+        npc_workers: int = 0,
+    ):
         pygame.init()
         self.width = width
         self.height = height
+        # Simulation runs in fixed ticks of dt seconds; rendering runs as
+        # fast as max_fps allows and interpolates between the last two ticks.
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.max_fps = max_fps
+        self.max_frame_time = 0.25
+        self.interpolation_alpha = 1.0
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption(GAME_NAME)
         self.clock = pygame.time.Clock()
@@ -27,18 +44,7 @@ class Game:
         self.cell_size = 40
         self.grid_width = width // self.cell_size
         self.grid_height = height // self.cell_size
-
-        self.player_x = width // 2
-        self.player_y = height // 2
         self.player_radius = 25
-        self.player_speed = 4
-        self.player_health = 100
-        self.max_player_health = 100
-
-        self.pathfinding = Pathfinding(
-            self.grid_width, self.grid_height, self.cell_size
-        )
-        self.setup_obstacles()
 
         self.font = pygame.font.Font(None, 48)
         self.title_font = pygame.font.Font(None, 72)
@@ -47,7 +53,6 @@ class Game:
 
         self.show_debug = False
         self.score = 0
-        self.time_alive = 0
         self.player_angle = 0
         self.background_gradient = [(15, 15, 35), (25, 20, 45)]
 
@@ -71,12 +76,39 @@ class Game:
             self.player_sprite = None
             self.player_sprite_width, self.player_sprite_height = 40, 40
 
+        enemy_sprites = ["inimigo1", "inimigo2", "inimigo3", "inimigo4"]
+        self.simulation = Simulation(
+            width,
+            height,
+            self.cell_size,
+            tick_rate,
+            seed=seed,
+            player_radius=(
+                max(self.player_sprite_width, self.player_sprite_height) // 2
+                if self.player_sprite
+                else self.player_radius
+            ),
+            npc_sprites=[
+                (name, self.sprites_manager.get_sprite(name)) for name in enemy_sprites
+            ],
+            npc_workers=npc_workers,
+        )
+        self.pathfinding = self.simulation.pathfinding
+        self.path_service = self.simulation.path_service
+        self.npc_manager = self.simulation.npc_manager
+        self.npcs = self.simulation.npcs
+
+        # Decorations and stars are cosmetic but drawn from the same seed, so
+        # a recorded session also looks the same when it is replayed.
+        self.rng = random.Random(self.simulation.seed)
+        self.record_path = record_path
+        self.recording = (
+            InputRecording.for_simulation(self.simulation) if record_path else None
+        )
+
         self.decorations = []
         self.setup_decorations()
 
-        self.npcs = []
-        self.setup_npcs()
-
         menu_sprite = self.sprites_manager.get_sprite("menu")
         if menu_sprite:
             original_width, original_height = menu_sprite.get_size()
@@ -167,42 +199,6 @@ class Game:
                 self.width // 2 - 100, self.height - 80, 200, 40
             )
 
-    def setup_obstacles(self):
-        num_obstacles = 18
-        attempts = 0
-        placed = 0
-        while placed < num_obstacles and attempts < 100:
-            x = random.randint(2, self.grid_width - 3) * self.cell_size
-            y = random.randint(2, self.grid_height - 3) * self.cell_size
-            grid_x = x // self.cell_size
-            grid_y = y // self.cell_size
-
-            player_grid_x = self.player_x // self.cell_size
-            player_grid_y = self.player_y // self.cell_size
-
-            if abs(grid_x - player_grid_x) > 3 or abs(grid_y - player_grid_y) > 3:
-                self.pathfinding.add_obstacle(x, y)
-                placed += 1
-            attempts += 1
-
-    def setup_npcs(self):
-        positions = [
-            (200, 200),
-            (1000, 200),
-            (200, 600),
-            (1000, 600),
-        ]
-
-        enemy_sprites = ["inimigo1", "inimigo2", "inimigo3", "inimigo4"]
-
-        for i, (x, y) in enumerate(positions):
-            sprite_name = enemy_sprites[i % len(enemy_sprites)]
-            enemy_sprite = self.sprites_manager.get_sprite(sprite_name)
-            npc = NPC(
-                x, y, self.pathfinding, sprite=enemy_sprite, sprite_name=sprite_name
-            )
-            self.npcs.append(npc)
-
     def setup_decorations(self):
         deco_sprites = ["deco1", "deco2", "deco3"]
         margin = 80
@@ -220,14 +216,14 @@ class Game:
 
                 decorations_per_type = num_decorations // len(deco_sprites)
                 for j in range(decorations_per_type):
-                    x = random.randint(margin, self.width - margin)
-                    y = random.randint(margin, self.height - margin)
+                    x = self.rng.randint(margin, self.width - margin)
+                    y = self.rng.randint(margin, self.height - margin)
 
                     grid_x = x // self.cell_size
                     grid_y = y // self.cell_size
 
-                    player_grid_x = self.player_x // self.cell_size
-                    player_grid_y = self.player_y // self.cell_size
+                    player_grid_x = self.simulation.player_x // self.cell_size
+                    player_grid_y = self.simulation.player_y // self.cell_size
 
                     if (
                         abs(grid_x - player_grid_x) > 2
@@ -244,58 +240,33 @@ class Game:
                                 }
                             )
 
-    def handle_input(self):
+    def read_input(self) -> InputCommand:
         keys = pygame.key.get_pressed()
-        dx, dy = 0, 0
+        move_x, move_y = 0, 0
 
         if keys[pygame.K_w] or keys[pygame.K_UP]:
-            dy -= self.player_speed
+            move_y -= 1
         if keys[pygame.K_s] or keys[pygame.K_DOWN]:
-            dy += self.player_speed
+            move_y += 1
         if keys[pygame.K_a] or keys[pygame.K_LEFT]:
-            dx -= self.player_speed
+            move_x -= 1
         if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
-            dx += self.player_speed
-
-        new_x = self.player_x + dx
-        new_y = self.player_y + dy
-
-        player_collision_radius = (
-            max(self.player_sprite_width, self.player_sprite_height) // 2
-            if self.player_sprite
-            else self.player_radius
-        )
-
-        grid_x = new_x // self.cell_size
-        grid_y = new_y // self.cell_size
+            move_x += 1
 
-        if self.pathfinding.is_walkable(grid_x, grid_y):
-            if player_collision_radius <= new_x < self.width - player_collision_radius:
-                self.player_x = new_x
-            if player_collision_radius <= new_y < self.height - player_collision_radius:
-                self.player_y = new_y
+        return InputCommand(move_x, move_y)
 
     def reset_game(self):
-        self.player_x = self.width // 2
-        self.player_y = self.height // 2
-        self.player_health = self.max_player_health
-        self.time_alive = 0
         self.score = 0
+        self.simulation.reset()
+        if self.recording is not None:
+            self.recording.mark_reset()
 
-        for npc in self.npcs:
-            npc.x = npc.start_x
-            npc.y = npc.start_y
-            npc.health = npc.max_health
-            npc.fsm.change_state(State.PATROL)
-            npc.path = []
-            npc.path_index = 0
-
-    def update(self):
+    def update(self, command: InputCommand = IDLE):
         if self.game_state == "menu" or self.game_state == "credits":
             return
 
         if self.game_state == "death":
-            self.death_timer += 1 / 60
+            self.death_timer += self.dt
 
             if self.death_timer < 1.0:
                 self.death_fade_alpha = min(255, int(self.death_timer * 255))
@@ -312,34 +283,14 @@ class Game:
                 self.reset_game()
             return
 
-        player_pos = (self.player_x, self.player_y)
-
-        keys = pygame.key.get_pressed()
-        if (
-            keys[pygame.K_w]
-            or keys[pygame.K_UP]
-            or keys[pygame.K_s]
-            or keys[pygame.K_DOWN]
-            or keys[pygame.K_a]
-            or keys[pygame.K_LEFT]
-            or keys[pygame.K_d]
-            or keys[pygame.K_RIGHT]
-        ):
-            self.player_angle += 0.15
-
-        self.time_alive += 1 / 60
+        if command.moving:
+            self.player_angle += 9.0 * self.dt
 
-        for npc in self.npcs:
-            if npc.is_alive():
-                npc.update(player_pos, self.npcs)
+        if self.recording is not None:
+            self.recording.record(command)
+        self.simulation.step(command)
 
-                if npc.fsm.get_state() == State.ATTACK:
-                    if npc.handle_attack(player_pos):
-                        self.player_health -= 5
-                        if self.player_health <= 0:
-                            self.player_health = 0
-
-        if self.player_health <= 0 and self.game_state == "playing":
+        if self.simulation.player_dead and self.game_state == "playing":
             self.game_state = "death"
             self.death_timer = 0
             self.death_fade_alpha = 0
@@ -381,6 +332,15 @@ class Game:
             return
 
         grid_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        pathfinding = self.pathfinding
+        for grid_y in range(pathfinding.grid_height):
+            for grid_x in range(pathfinding.grid_width):
+                index = pathfinding.cell_index(grid_x, grid_y)
+                if pathfinding.visible[index] and pathfinding.walkable[index]:
+                    grid_surface.fill(
+                        (255, 230, 120, 18),
+                        (grid_x * self.cell_size, grid_y * self.cell_size, self.cell_size, self.cell_size),
+                    )
         for x in range(0, self.width, self.cell_size):
             pygame.draw.line(grid_surface, (40, 35, 50, 30), (x, 0), (x, self.height))
         for y in range(0, self.height, self.cell_size):
@@ -402,8 +362,10 @@ class Game:
         title_text = self.medium_font.render(GAME_NAME, True, (150, 200, 255))
         self.screen.blit(title_text, (ui_padding, ui_y))
 
+        simulation = self.simulation
+
         health_text = self.small_font.render(
-            f"Vida: {self.player_health}/{self.max_player_health}",
+            f"Vida: {simulation.player_health}/{simulation.max_player_health}",
             True,
             (255, 255, 255),
         )
@@ -414,7 +376,7 @@ class Game:
         health_fill = pygame.Rect(
             ui_padding,
             ui_y + 55,
-            int(200 * (self.player_health / self.max_player_health)),
+            int(200 * (simulation.player_health / simulation.max_player_health)),
             8,
         )
         Graphics.draw_gradient_rect(
@@ -432,7 +394,7 @@ class Game:
         self.screen.blit(border_surface, health_bar_rect)
 
         time_text = self.small_font.render(
-            f"Tempo: {self.time_alive:.1f}s", True, (200, 200, 255)
+            f"Tempo: {simulation.time_alive:.1f}s", True, (200, 200, 255)
         )
         self.screen.blit(time_text, (ui_padding, ui_y + 70))
 
@@ -481,7 +443,7 @@ class Game:
             self.screen.blit(game_over, text_rect)
 
             time_survived = self.medium_font.render(
-                f"Tempo de Sobrevivência: {self.time_alive:.1f}s", True, (255, 255, 255)
+                f"Tempo de Sobrevivência: {simulation.time_alive:.1f}s", True, (255, 255, 255)
             )
             time_rect = time_survived.get_rect(
                 center=(self.width // 2, self.height // 2 + 20)
@@ -496,6 +458,51 @@ class Game:
             )
             self.screen.blit(restart_text, restart_rect)
 
+    def draw_search_stats(self):
+        if not self.show_debug:
+            return
+
+        stats = self.pathfinding.telemetry.get_stats()
+        histogram = self.pathfinding.telemetry.histogram
+        panel_rect = pygame.Rect(self.width - 270, 10, 260, 250)
+        panel_surface = pygame.Surface(
+            (panel_rect.width, panel_rect.height), pygame.SRCALPHA
+        )
+        panel_surface.fill((20, 20, 35, 200))
+        self.screen.blit(panel_surface, panel_rect)
+        pygame.draw.rect(self.screen, (255, 255, 255, 30), panel_rect, 2)
+
+        lines = [
+            f"Buscas: {stats['searches']} ({stats['failures']} falhas)",
+            f"Nós expandidos: {stats['mean_expanded']:.1f}/busca",
+            f"Nós inseridos: {stats['nodes_pushed']}",
+            f"Pico do heap: {stats['heap_peak']}",
+            f"Caminho médio: {stats['mean_path_length']:.1f}",
+            f"Tempo p50/p95: {stats['p50_ms']:.2f}/{stats['p95_ms']:.2f} ms",
+            f"Tempo máx: {stats['max_ms']:.2f} ms",
+        ]
+        text_x = panel_rect.x + 10
+        text_y = panel_rect.y + 8
+        for line in lines:
+            text = self.small_font.render(line, True, (200, 200, 255))
+            self.screen.blit(text, (text_x, text_y))
+            text_y += 20
+
+        bar_area_height = 70
+        bar_width = (panel_rect.width - 20) // len(histogram)
+        tallest = max(max(histogram), 1)
+        base_y = panel_rect.bottom - 10
+        for bucket, count in enumerate(histogram):
+            bar_height = int(bar_area_height * count / tallest)
+            bar_rect = pygame.Rect(
+                text_x + bucket * bar_width, base_y - bar_height, bar_width - 2, bar_height
+            )
+            pygame.draw.rect(self.screen, (150, 200, 255), bar_rect)
+        bound_text = self.small_font.render(
+            f"<{LATENCY_BUCKETS_MS[0]}ms ... >{LATENCY_BUCKETS_MS[-1]}ms", True, (150, 150, 180)
+        )
+        self.screen.blit(bound_text, (text_x, base_y - bar_area_height - 20))
+
     def draw_background(self):
         Graphics.draw_gradient_rect(
             self.screen,
@@ -508,10 +515,10 @@ class Game:
         if not hasattr(self, "stars"):
             self.stars = [
                 (
-                    random.randint(0, self.width),
-                    random.randint(0, self.height),
-                    random.randint(1, 3),
-                    random.randint(30, 80),
+                    self.rng.randint(0, self.width),
+                    self.rng.randint(0, self.height),
+                    self.rng.randint(1, 3),
+                    self.rng.randint(30, 80),
                 )
                 for _ in range(30)
             ]
@@ -618,16 +625,21 @@ class Game:
             self.draw_grid()
             self.draw_obstacles()
 
+            alpha = self.interpolation_alpha
             for npc in self.npcs:
                 if npc.is_alive():
-                    npc.draw(self.screen)
+                    npc.draw(self.screen, alpha)
 
+            simulation = self.simulation
+            previous_x, previous_y = simulation.previous_player_pos
+            player_pos = (
+                int(previous_x + (simulation.player_x - previous_x) * alpha),
+                int(previous_y + (simulation.player_y - previous_y) * alpha),
+            )
             if self.player_sprite:
-                player_pos = (int(self.player_x), int(self.player_y))
                 sprite_rect = self.player_sprite.get_rect(center=player_pos)
                 self.screen.blit(self.player_sprite, sprite_rect)
             else:
-                player_pos = (int(self.player_x), int(self.player_y))
                 Graphics.draw_glow_circle(
                     self.screen, (100, 200, 255), player_pos, self.player_radius, 8
                 )
@@ -638,6 +650,7 @@ class Game:
                 pygame.draw.polygon(self.screen, (150, 220, 255), player_points, 2)
 
             self.draw_ui()
+            self.draw_search_stats()
 
         pygame.display.flip()
 
@@ -664,8 +677,19 @@ class Game:
             return True
         return False
 
+    def step(self):
+        self.update(self.read_input() if self.game_state == "playing" else IDLE)
+
     def run(self):
+        accumulator = 0.0
+        self.clock.tick()
         while self.running:
+            # A slow frame is paid back with extra ticks instead of slowing
+            # the game down, up to max_frame_time so a long stall cannot
+            # snowball into ever more catch-up work.
+            frame_time = self.clock.tick(self.max_fps) / 1000
+            accumulator += min(frame_time, self.max_frame_time)
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
@@ -680,6 +704,7 @@ class Game:
                             self.running = False
                     elif event.key == pygame.K_F1:
                         self.show_debug = not self.show_debug
+                        self.pathfinding.telemetry_enabled = self.show_debug
                     elif event.key == pygame.K_SPACE:
                         if self.game_state == "menu":
                             self.game_state = "playing"
@@ -691,11 +716,17 @@ class Game:
                         elif self.game_state == "credits":
                             self.handle_credits_click(event.pos)
 
-            if self.game_state == "playing":
-                self.handle_input()
-
-            self.update()
+            while accumulator >= self.dt:
+                self.step()
+                accumulator -= self.dt
+            self.interpolation_alpha = accumulator / self.dt
             self.draw()
-            self.clock.tick(60)
 
+        self.simulation.shutdown()
+        if self.recording is not None:
+            self.recording.save(self.record_path)
+            print(
+                f"Recorded {len(self.recording)} ticks (seed {self.simulation.seed}) "
+                f"to {self.record_path}"
+            )
         pygame.quit()
@@ -0,0 +1,404 @@
+import heapq
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from pathfinding import FLOW_UNREACHABLE, Pathfinding
+
+ENTRANCE_SPLIT_LENGTH = 6
+RIGHT_BORDER = 0
+BOTTOM_BORDER = 1
+CORNER = 2
+
+
+class HierarchicalPathfinding:
+    def __init__(self, pathfinding: Pathfinding, cluster_size: int = 16):
+        self.pathfinding = pathfinding
+        self.cluster_size = cluster_size
+        self.clusters_x = -(-pathfinding.grid_width // cluster_size)
+        self.clusters_y = -(-pathfinding.grid_height // cluster_size)
+        cluster_count = self.clusters_x * self.clusters_y
+
+        # Abstract graph: entrance cells (grid indices) -> {neighbour: cost}.
+        self.graph: Dict[int, Dict[int, int]] = {}
+        self.cluster_nodes: List[Set[int]] = [set() for _ in range(cluster_count)]
+        self._border_pairs: Dict[Tuple[int, int], List[Tuple[int, int, int]]] = {}
+        self._node_refs: Dict[int, int] = {}
+        self._dirty_borders: Set[Tuple[int, int]] = set()
+        self._dirty_clusters: Set[int] = set(range(cluster_count))
+        self.last_expanded = 0
+        self.cluster_rebuilds = 0
+
+        self.cell_cluster = array(
+            "l",
+            (
+                self._cluster_at(pathfinding.cell_x[index], pathfinding.cell_y[index])
+                for index in range(pathfinding.size)
+            ),
+        )
+        self._cost = [0] * pathfinding.size
+        self._parent = [0] * pathfinding.size
+        self._seen = [0] * pathfinding.size
+        self._generation = 0
+
+        for cluster in range(cluster_count):
+            cluster_x = cluster % self.clusters_x
+            cluster_y = cluster // self.clusters_x
+            if cluster_x + 1 < self.clusters_x:
+                self._dirty_borders.add((cluster, RIGHT_BORDER))
+            if cluster_y + 1 < self.clusters_y:
+                self._dirty_borders.add((cluster, BOTTOM_BORDER))
+            if cluster_x + 1 < self.clusters_x and cluster_y + 1 < self.clusters_y:
+                self._dirty_borders.add((cluster, CORNER))
+
+        pathfinding.add_obstacle_listener(self._on_obstacle_changed)
+        self.refresh()
+
+    def _cluster_at(self, grid_x: int, grid_y: int) -> int:
+        if not self.pathfinding.in_bounds(grid_x, grid_y):
+            return -1
+        return (grid_y // self.cluster_size) * self.clusters_x + grid_x // self.cluster_size
+
+    def cluster_of(self, index: int) -> int:
+        return self.cell_cluster[index]
+
+    def cluster_bounds(self, cluster: int) -> Tuple[int, int, int, int]:
+        x0 = (cluster % self.clusters_x) * self.cluster_size
+        y0 = (cluster // self.clusters_x) * self.cluster_size
+        x1 = min(x0 + self.cluster_size, self.pathfinding.grid_width)
+        y1 = min(y0 + self.cluster_size, self.pathfinding.grid_height)
+        return x0, y0, x1, y1
+
+    def _on_obstacle_changed(self, index: int):
+        cluster = self.cluster_of(index)
+        grid_x, grid_y = self.pathfinding.index_to_cell(index)
+        x0, y0, x1, y1 = self.cluster_bounds(cluster)
+        left = grid_x == x0 and x0 > 0
+        right = grid_x == x1 - 1 and x1 < self.pathfinding.grid_width
+        top = grid_y == y0 and y0 > 0
+        bottom = grid_y == y1 - 1 and y1 < self.pathfinding.grid_height
+        self._dirty_clusters.add(cluster)
+
+        if left:
+            self._mark_border(cluster - 1, RIGHT_BORDER)
+        if right:
+            self._mark_border(cluster, RIGHT_BORDER)
+        if top:
+            self._mark_border(cluster - self.clusters_x, BOTTOM_BORDER)
+        if bottom:
+            self._mark_border(cluster, BOTTOM_BORDER)
+        if right and bottom:
+            self._mark_border(cluster, CORNER)
+        if left and bottom:
+            self._mark_border(cluster - 1, CORNER)
+        if right and top:
+            self._mark_border(cluster - self.clusters_x, CORNER)
+        if left and top:
+            self._mark_border(cluster - self.clusters_x - 1, CORNER)
+
+    def _mark_border(self, cluster: int, side: int):
+        self._dirty_borders.add((cluster, side))
+        self._dirty_clusters.add(cluster)
+        if side != BOTTOM_BORDER:
+            self._dirty_clusters.add(cluster + 1)
+        if side != RIGHT_BORDER:
+            self._dirty_clusters.add(cluster + self.clusters_x)
+        if side == CORNER:
+            self._dirty_clusters.add(cluster + self.clusters_x + 1)
+
+    def refresh(self):
+        for cluster, side in self._dirty_borders:
+            self._rebuild_border(cluster, side)
+        self._dirty_borders.clear()
+
+    @property
+    def dirty_clusters(self) -> Set[int]:
+        return set(self._dirty_clusters)
+
+    def rebuild_dirty(self) -> int:
+        # Eagerly rebuilds every cluster a search would otherwise rebuild
+        # lazily; returns how many there were.
+        self.refresh()
+        dirty = sorted(self._dirty_clusters)
+        for cluster in dirty:
+            self._ensure_cluster(cluster)
+        return len(dirty)
+
+    def _ensure_cluster(self, cluster: int):
+        # Intra-cluster edges are rebuilt lazily, the first time a search
+        # reaches a dirty cluster.
+        if cluster in self._dirty_clusters:
+            self._dirty_clusters.discard(cluster)
+            self._rebuild_cluster(cluster)
+            self.cluster_rebuilds += 1
+
+    def _acquire_node(self, index: int):
+        if index not in self._node_refs:
+            self._node_refs[index] = 0
+            self.graph[index] = {}
+            self.cluster_nodes[self.cluster_of(index)].add(index)
+        self._node_refs[index] += 1
+
+    def _release_node(self, index: int):
+        self._node_refs[index] -= 1
+        if self._node_refs[index] > 0:
+            return
+        del self._node_refs[index]
+        for neighbor in self.graph.pop(index):
+            self.graph[neighbor].pop(index, None)
+        self.cluster_nodes[self.cluster_of(index)].discard(index)
+
+    def _rebuild_border(self, cluster: int, side: int):
+        graph = self.graph
+        for inside, outside, _ in self._border_pairs.pop((cluster, side), []):
+            graph[inside].pop(outside, None)
+            graph[outside].pop(inside, None)
+            self._release_node(inside)
+            self._release_node(outside)
+
+        if side == CORNER:
+            pairs = self._corner_crossings(cluster)
+        else:
+            pairs = self._border_crossings(cluster, side)
+
+        for inside, outside, cost in pairs:
+            self._acquire_node(inside)
+            self._acquire_node(outside)
+            graph[inside][outside] = cost
+            graph[outside][inside] = cost
+        self._border_pairs[(cluster, side)] = pairs
+
+    def _border_crossings(self, cluster: int, side: int) -> List[Tuple[int, int, int]]:
+        pathfinding = self.pathfinding
+        walkable = pathfinding.walkable
+        x0, y0, x1, y1 = self.cluster_bounds(cluster)
+        if side == RIGHT_BORDER:
+            cells = [pathfinding.cell_index(x1 - 1, y) for y in range(y0, y1)]
+            across = 1
+        else:
+            cells = [pathfinding.cell_index(x, y1 - 1) for x in range(x0, x1)]
+            across = pathfinding.stride
+
+        # Straight crossings come in runs that are connected on both sides,
+        # so one or two entrances per run are enough.
+        pairs = []
+        run: List[int] = []
+        for cell in cells + [None]:
+            if cell is not None and walkable[cell] and walkable[cell + across]:
+                run.append(cell)
+                continue
+            if run:
+                if len(run) < ENTRANCE_SPLIT_LENGTH:
+                    entrances = [run[len(run) // 2]]
+                else:
+                    entrances = [run[0], run[-1]]
+                pairs.extend((inside, inside + across, 10) for inside in entrances)
+                run = []
+
+        # Diagonal moves may cut blocked corners, so a border can also be
+        # crossed where no straight crossing is adjacent.
+        for inside, next_inside in zip(cells, cells[1:]):
+            outside = inside + across
+            next_outside = next_inside + across
+            if (
+                walkable[inside]
+                and walkable[next_outside]
+                and not walkable[outside]
+                and not walkable[next_inside]
+            ):
+                pairs.append((inside, next_outside, 14))
+            if (
+                walkable[next_inside]
+                and walkable[outside]
+                and not walkable[inside]
+                and not walkable[next_outside]
+            ):
+                pairs.append((next_inside, outside, 14))
+        return pairs
+
+    def _corner_crossings(self, cluster: int) -> List[Tuple[int, int, int]]:
+        pathfinding = self.pathfinding
+        walkable = pathfinding.walkable
+        _, _, x1, y1 = self.cluster_bounds(cluster)
+        top_left = pathfinding.cell_index(x1 - 1, y1 - 1)
+        top_right = top_left + 1
+        bottom_left = top_left + pathfinding.stride
+        bottom_right = bottom_left + 1
+
+        pairs = []
+        if (
+            walkable[top_left]
+            and walkable[bottom_right]
+            and not walkable[top_right]
+            and not walkable[bottom_left]
+        ):
+            pairs.append((top_left, bottom_right, 14))
+        if (
+            walkable[top_right]
+            and walkable[bottom_left]
+            and not walkable[top_left]
+            and not walkable[bottom_right]
+        ):
+            pairs.append((top_right, bottom_left, 14))
+        return pairs
+
+    def _rebuild_cluster(self, cluster: int):
+        graph = self.graph
+        nodes = self.cluster_nodes[cluster]
+        for node in nodes:
+            edges = graph[node]
+            for neighbor in [n for n in edges if n in nodes]:
+                del edges[neighbor]
+        for node in nodes:
+            for other, cost in self._local_search(node, cluster, nodes).items():
+                if other != node:
+                    graph[node][other] = cost
+
+    def _local_search(self, start: int, cluster: int, targets: Set[int]) -> Dict[int, int]:
+        pathfinding = self.pathfinding
+        walkable = pathfinding.walkable
+        offsets = pathfinding.neighbor_offsets
+        cell_cluster = self.cell_cluster
+        cost = self._cost
+        parent = self._parent
+        seen = self._seen
+        shift = pathfinding._index_bits
+        mask = pathfinding._index_mask
+        push = heapq.heappush
+        pop = heapq.heappop
+
+        self._generation += 2
+        opened = self._generation
+        closed = opened + 1
+
+        seen[start] = opened
+        cost[start] = 0
+        parent[start] = -1
+        open_set = [start]
+        found: Dict[int, int] = {}
+        expanded = 0
+        while open_set and len(found) < len(targets):
+            current = pop(open_set) & mask
+            if seen[current] == closed:
+                continue
+            seen[current] = closed
+            expanded += 1
+            current_cost = cost[current]
+            if current in targets:
+                found[current] = current_cost
+
+            for offset, step in offsets:
+                neighbor = current + offset
+                if not walkable[neighbor] or cell_cluster[neighbor] != cluster:
+                    continue
+                neighbor_seen = seen[neighbor]
+                if neighbor_seen == closed:
+                    continue
+                new_cost = current_cost + step
+                if neighbor_seen != opened or new_cost < cost[neighbor]:
+                    seen[neighbor] = opened
+                    cost[neighbor] = new_cost
+                    parent[neighbor] = current
+                    push(open_set, (new_cost << shift) | neighbor)
+
+        self.last_expanded += expanded
+        return found
+
+    def find_abstract_path(self, start: int, goal: int) -> List[int]:
+        self.refresh()
+        self.last_expanded = 0
+
+        start_cluster = self.cluster_of(start)
+        goal_cluster = self.cluster_of(goal)
+        start_targets = self.cluster_nodes[start_cluster] | {goal}
+        start_edges = self._local_search(start, start_cluster, start_targets)
+        start_edges.pop(start, None)
+        goal_edges = self._local_search(goal, goal_cluster, self.cluster_nodes[goal_cluster])
+
+        graph = self.graph
+        heuristic = self.pathfinding.heuristic
+        g_cost = {start: 0}
+        parent = {start: -1}
+        closed: Set[int] = set()
+        open_set = [(heuristic(start, goal), start)]
+        while open_set:
+            _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue
+            closed.add(current)
+            self.last_expanded += 1
+
+            if current == goal:
+                path = []
+                while current != -1:
+                    path.append(current)
+                    current = parent[current]
+                return path[::-1]
+
+            self._ensure_cluster(self.cluster_of(current))
+            edges = list(graph.get(current, {}).items())
+            if current == start:
+                edges.extend(start_edges.items())
+            if current in goal_edges:
+                edges.append((goal, goal_edges[current]))
+
+            current_g = g_cost[current]
+            for neighbor, cost in edges:
+                if neighbor in closed:
+                    continue
+                tentative_g = current_g + cost
+                if tentative_g < g_cost.get(neighbor, FLOW_UNREACHABLE):
+                    g_cost[neighbor] = tentative_g
+                    parent[neighbor] = current
+                    h = heuristic(neighbor, goal)
+                    heapq.heappush(open_set, (tentative_g + h, neighbor))
+
+        return []
+
+    def refine_segment(self, start: int, end: int) -> List[int]:
+        cluster = self.cluster_of(start)
+        if cluster != self.cluster_of(end):
+            return [start, end]
+
+        if not self._local_search(start, cluster, {end}):
+            return []
+        path = []
+        current = end
+        while current != -1:
+            path.append(current)
+            current = self._parent[current]
+        return path[::-1]
+
+    def find_path(
+        self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int]
+    ) -> List[Tuple[int, int]]:
+        endpoints = self.pathfinding.resolve_endpoints(start_pos, goal_pos)
+        if endpoints is None:
+            return []
+        start, goal = endpoints
+        if start == goal:
+            return [goal_pos]
+
+        abstract_path = self.find_abstract_path(start, goal)
+        if not abstract_path:
+            return []
+        cells = [start]
+        for segment_start, segment_end in zip(abstract_path, abstract_path[1:]):
+            cells.extend(self.refine_segment(segment_start, segment_end)[1:])
+        return [self.pathfinding.index_to_world(index) for index in cells]
+
+    def get_next_step(
+        self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int]
+    ) -> Optional[Tuple[int, int]]:
+        endpoints = self.pathfinding.resolve_endpoints(start_pos, goal_pos)
+        if endpoints is None:
+            return None
+        start, goal = endpoints
+        if start == goal:
+            return goal_pos
+
+        abstract_path = self.find_abstract_path(start, goal)
+        for segment_start, segment_end in zip(abstract_path, abstract_path[1:]):
+            segment = self.refine_segment(segment_start, segment_end)
+            if len(segment) > 1:
+                return self.pathfinding.index_to_world(segment[1])
+        return None
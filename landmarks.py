@@ -0,0 +1,136 @@
+import struct
+import zlib
+from array import array
+from typing import List, Tuple
+
+from pathfinding import FLOW_UNREACHABLE, Pathfinding
+
+FILE_MAGIC = b"ALT1"
+HEADER = struct.Struct("<4sIIII")
+
+
+class LandmarkHeuristic:
+    def __init__(self, pathfinding: Pathfinding, count: int = 16, active: int = 4):
+        self.pathfinding = pathfinding
+        self.count = count
+        self.active = active
+        self.landmarks: List[int] = []
+        self.tables: List[array] = []
+        self.version = -1
+        self.builds = 0
+
+    def _checksum(self) -> int:
+        return zlib.crc32(self.pathfinding.walkable)
+
+    def refresh(self) -> bool:
+        pathfinding = self.pathfinding
+        if self.version == pathfinding.obstacle_version:
+            return False
+
+        walkable = pathfinding.walkable
+        if self.landmarks and all(walkable[index] for index in self.landmarks):
+            self.tables = [array("I", pathfinding.distance_field(index)) for index in self.landmarks]
+        else:
+            self._select_landmarks()
+        self.version = pathfinding.obstacle_version
+        self.builds += 1
+        return True
+
+    def _select_landmarks(self):
+        # Farthest-point selection: each new landmark is the cell farthest
+        # from every landmark chosen so far, so the set spreads out to the
+        # map's extremities where the triangle bound is tightest.
+        pathfinding = self.pathfinding
+        walkable = pathfinding.walkable
+        cells = [index for index in range(pathfinding.size) if walkable[index]]
+        self.landmarks = []
+        self.tables = []
+        if not cells or self.count <= 0:
+            return
+
+        field = pathfinding.distance_field(cells[0])
+        landmark = max(cells, key=lambda index: field[index] % FLOW_UNREACHABLE)
+        nearest = [FLOW_UNREACHABLE] * pathfinding.size
+        while len(self.landmarks) < self.count:
+            field = pathfinding.distance_field(landmark)
+            self.landmarks.append(landmark)
+            self.tables.append(array("I", field))
+            for index in cells:
+                if field[index] < nearest[index]:
+                    nearest[index] = field[index]
+            landmark = max(cells, key=nearest.__getitem__)
+            if nearest[landmark] == 0:
+                break
+
+    def goal_distances(self, goal: int, start: int = -1) -> List[Tuple[array, int]]:
+        self.refresh()
+        bounds = [(table, table[goal]) for table in self.tables]
+        if start >= 0 and len(bounds) > self.active:
+            # Only the landmarks giving the tightest bound at the start are
+            # consulted per node; the rest rarely win and cost a lookup each.
+            bounds.sort(key=lambda bound: -abs(bound[0][start] - bound[1]))
+            del bounds[self.active :]
+        return bounds
+
+    def separated(self, start: int, goal: int) -> bool:
+        # A landmark that reaches exactly one of the two cells proves they lie
+        # in different components, so the search can fail without flooding.
+        self.refresh()
+        for table in self.tables:
+            if (table[start] == FLOW_UNREACHABLE) != (table[goal] == FLOW_UNREACHABLE):
+                return True
+        return False
+
+    def estimate(self, index: int, goal: int) -> int:
+        cell_x = self.pathfinding.cell_x
+        cell_y = self.pathfinding.cell_y
+        dx = abs(cell_x[index] - cell_x[goal])
+        dy = abs(cell_y[index] - cell_y[goal])
+        best = 10 * max(dx, dy) + 4 * min(dx, dy)
+        for table, goal_distance in self.goal_distances(goal):
+            bound = abs(table[index] - goal_distance)
+            if bound > best:
+                best = bound
+        return best
+
+    def save(self, path: str):
+        self.refresh()
+        pathfinding = self.pathfinding
+        with open(path, "wb") as handle:
+            handle.write(
+                HEADER.pack(
+                    FILE_MAGIC,
+                    pathfinding.grid_width,
+                    pathfinding.grid_height,
+                    len(self.landmarks),
+                    self._checksum(),
+                )
+            )
+            array("I", self.landmarks).tofile(handle)
+            for table in self.tables:
+                table.tofile(handle)
+
+    def load(self, path: str):
+        pathfinding = self.pathfinding
+        with open(path, "rb") as handle:
+            magic, grid_width, grid_height, count, checksum = HEADER.unpack(
+                handle.read(HEADER.size)
+            )
+            if magic != FILE_MAGIC:
+                raise ValueError(f"{path} is not a landmark table file")
+            if (grid_width, grid_height) != (pathfinding.grid_width, pathfinding.grid_height):
+                raise ValueError(f"{path} was built for a {grid_width}x{grid_height} grid")
+            if checksum != self._checksum():
+                raise ValueError(f"{path} was built for a different obstacle layout")
+
+            landmarks = array("I")
+            landmarks.fromfile(handle, count)
+            tables = []
+            for _ in range(count):
+                table = array("I")
+                table.fromfile(handle, pathfinding.size)
+                tables.append(table)
+
+        self.landmarks = list(landmarks)
+        self.tables = tables
+        self.version = pathfinding.obstacle_version
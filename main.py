@@ -1,5 +1,21 @@
+import argparse
+
 from game import Game
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="Neural Pursuit")
+    parser.add_argument("--seed", type=int, help="seed for the obstacle layout")
+    parser.add_argument(
+        "--record", metavar="PATH", help="save the session's inputs for headless replay"
+    )
+    parser.add_argument(
+        "--npc-workers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="step NPCs in N worker processes over shared memory",
+    )
+    args = parser.parse_args()
+
+    game = Game(seed=args.seed, record_path=args.record, npc_workers=args.npc_workers)
     game.run()
@@ -1,13 +1,36 @@
 import pygame
 import math
 from pathfinding import Pathfinding
-from fsm import FSM, State
-from utils import distance, normalize_vector
+from fsm import State
+from npc_manager import RESUME_PATROL_RANGE, NPCManager, ManagedFSM, array_field
+from utils import distance, normalize_vector, point_segment_distance
 from graphics import Graphics
-from collision import check_circle_collision, resolve_circle_collision
+from collision import SpatialHash, check_circle_collision, resolve_circle_collision
+
+
+class TickContext:
+    __slots__ = ("player_pos", "to_player_sq", "from_start_sq")
+
+    def __init__(self, player_pos, to_player_sq: float, from_start_sq: float):
+        self.player_pos = player_pos
+        self.to_player_sq = to_player_sq
+        self.from_start_sq = from_start_sq
 
 
 class NPC:
+    x = array_field("x")
+    y = array_field("y")
+    start_x = array_field("start_x", wakes=True)
+    start_y = array_field("start_y", wakes=True)
+    health = array_field("health", wakes=True)
+    max_health = array_field("max_health")
+    attack_cooldown = array_field("attack_cooldown")
+    detection_range = array_field("detection_range", wakes=True)
+    attack_range = array_field("attack_range", wakes=True)
+    return_threshold = array_field("return_threshold", wakes=True)
+    radius = array_field("radius")
+    body_radius = array_field("body_radius")
+
     def __init__(
         self,
         x: int,
@@ -16,18 +39,30 @@ class NPC:
         color: tuple = (255, 0, 0),
         sprite=None,
         sprite_name=None,
+        chase_planner=None,
+        path_service=None,
+        manager=None,
+        radius=None,
     ):
-        self.x = float(x)
-        self.y = float(y)
-        self.start_x = float(x)
-        self.start_y = float(y)
+        # Positions, health, cooldowns, ranges and FSM state live in the
+        # manager's arrays; the object only keeps its slot into them.
+        self.manager = manager or NPCManager(capacity=1)
+        self.slot = self.manager.add(self, x, y)
         self.radius = 20
-        self.speed = 4.5
+        self.speed = 270.0
+        self.attack_interval = 1.0
         self.color = color
         self.pathfinding = pathfinding
-        self.fsm = FSM(State.PATROL)
+        self.chase_planner = chase_planner
+        self.path_service = path_service
+        self.path_request = None
+        self.fsm = ManagedFSM(self.manager, self.slot, State.PATROL)
         self.path = []
         self.path_index = 0
+        self.path_goal = None
+        self.path_origin = None
+        self.path_version = -1
+        self.replans = 0
         self.patrol_targets = []
         self.patrol_index = 0
         self.chase_target = None
@@ -51,6 +86,11 @@ class NPC:
             self.radius = max(self.sprite_width, self.sprite_height) // 2 + 5
         else:
             self.sprite_width, self.sprite_height = 40, 40
+        if radius is not None:
+            self.radius = radius
+
+        self.body_radius = pathfinding.body_radius(self.radius)
+        self.manager.attach(pathfinding)
 
         self.setup_fsm()
         self.setup_patrol_points()
@@ -66,10 +106,12 @@ class NPC:
         ]
 
     def setup_fsm(self):
-        self.fsm.add_state_handler(State.PATROL, lambda p, o=None: self.handle_patrol(p, o))
-        self.fsm.add_state_handler(State.CHASE, lambda p, o=None: self.handle_chase(p, o))
+        self.fsm.add_state_handler(State.PATROL, self.handle_patrol)
+        self.fsm.add_state_handler(State.CHASE, self.handle_chase)
         self.fsm.add_state_handler(State.ATTACK, self.handle_attack)
-        self.fsm.add_state_handler(State.RETURN, lambda p, o=None: self.handle_return(p, o))
+        self.fsm.add_state_handler(State.RETURN, self.handle_return)
+        for state in State:
+            self.fsm.add_exit_hook(state, lambda previous, new: self.clear_path())
 
         self.fsm.add_transition(State.PATROL, State.CHASE, self.should_chase)
         self.fsm.add_transition(State.CHASE, State.ATTACK, self.should_attack)
@@ -79,38 +121,48 @@ class NPC:
         )
         self.fsm.add_transition(State.ATTACK, State.RETURN, self.should_return)
         self.fsm.add_transition(State.RETURN, State.PATROL, self.should_resume_patrol)
-
-    def should_chase(self, player_pos: tuple) -> bool:
+        self.fsm.compile()
+
+    def tick_context(self, player_pos: tuple) -> TickContext:
+        # Squared distances shared by every guard this tick; a missing player
+        # is infinitely far away.
+        x = self.x
+        y = self.y
+        from_start_x = x - self.start_x
+        from_start_y = y - self.start_y
         if player_pos is None:
-            return False
-        dist = distance((self.x, self.y), player_pos)
-        return dist <= self.detection_range
+            to_player_sq = math.inf
+        else:
+            to_player_x = x - player_pos[0]
+            to_player_y = y - player_pos[1]
+            to_player_sq = to_player_x * to_player_x + to_player_y * to_player_y
+        return TickContext(
+            player_pos, to_player_sq, from_start_x * from_start_x + from_start_y * from_start_y
+        )
 
-    def should_attack(self, player_pos: tuple) -> bool:
-        if player_pos is None:
-            return False
-        dist = distance((self.x, self.y), player_pos)
-        return dist <= self.attack_range
+    def should_chase(self, context: TickContext) -> bool:
+        return context.to_player_sq <= self.detection_range**2 and self.sees(context.player_pos)
 
-    def should_chase_after_attack(self, player_pos: tuple) -> bool:
-        if player_pos is None:
-            return False
-        dist = distance((self.x, self.y), player_pos)
-        return dist > self.attack_range and dist <= self.detection_range
+    def sees(self, player_pos: tuple) -> bool:
+        # The field of view is shared by every NPC on the grid and only
+        # rebuilt when the player changes cell or the obstacles change.
+        self.pathfinding.update_field_of_view(player_pos, self.detection_range)
+        return self.pathfinding.is_visible((self.x, self.y))
 
-    def should_return(self, player_pos: tuple) -> bool:
-        dist_from_start = distance((self.x, self.y), (self.start_x, self.start_y))
-        if player_pos is None:
-            return dist_from_start > self.return_threshold
-        dist_from_player = distance((self.x, self.y), player_pos)
+    def should_attack(self, context: TickContext) -> bool:
+        return context.to_player_sq <= self.attack_range**2
+
+    def should_chase_after_attack(self, context: TickContext) -> bool:
+        return self.attack_range**2 < context.to_player_sq <= self.detection_range**2
+
+    def should_return(self, context: TickContext) -> bool:
         return (
-            dist_from_player > self.detection_range
-            and dist_from_start > self.return_threshold
+            context.to_player_sq > self.detection_range**2
+            and context.from_start_sq > self.return_threshold**2
         )
 
-    def should_resume_patrol(self, player_pos: tuple) -> bool:
-        dist_from_start = distance((self.x, self.y), (self.start_x, self.start_y))
-        return dist_from_start <= 50
+    def should_resume_patrol(self, context: TickContext) -> bool:
+        return context.from_start_sq <= RESUME_PATROL_RANGE**2
 
     def handle_patrol(self, player_pos: tuple, other_npcs=None):
         if not self.patrol_targets:
@@ -122,17 +174,91 @@ class NPC:
         if dist < 20:
             self.patrol_index = (self.patrol_index + 1) % len(self.patrol_targets)
             target = self.patrol_targets[self.patrol_index]
-            self.path = []
+            self.clear_path()
+
+        self.plan_route(target)
+        self.follow_path(other_npcs, player_pos, self.pathfinding)
+
+    def plan_route(self, goal_pos: tuple):
+        if self.route_is_valid(goal_pos):
+            return
+        if self.path_service:
+            self.request_path(goal_pos)
+            return
+        path = self.pathfinding.find_path(
+            (int(self.x), int(self.y)), goal_pos, self.body_radius
+        )
+        self.set_path(path, goal_pos)
 
-        if not self.path or len(self.path) == 0:
-            next_step = self.pathfinding.get_next_step(
-                (int(self.x), int(self.y)), target
+    def route_is_valid(self, goal_pos: tuple) -> bool:
+        # A route is kept until one of the replan triggers fires: the goal
+        # drifted more than a cell, the obstacle layout changed, the path ran
+        # out, or the NPC was pushed out of its corridor.
+        if self.path_goal is None:
+            return False
+        if distance(goal_pos, self.path_goal) > self.pathfinding.cell_size:
+            return False
+        if self.path_version != self.pathfinding.obstacle_version:
+            return False
+        if not self.path:
+            return True
+        if self.path_index >= len(self.path):
+            return False
+        segment_start = self.path[self.path_index - 1] if self.path_index else self.path_origin
+        corridor = point_segment_distance(
+            (self.x, self.y), segment_start, self.path[self.path_index]
+        )
+        return corridor <= self.pathfinding.cell_size
+
+    def route_passes(self, point: tuple, clearance: float) -> bool:
+        if not self.path or self.path_index >= len(self.path):
+            return False
+        segment_start = self.path[self.path_index - 1] if self.path_index else self.path_origin
+        for waypoint in self.path[self.path_index :]:
+            if point_segment_distance(point, segment_start, waypoint) <= clearance:
+                return True
+            segment_start = waypoint
+        return False
+
+    def set_path(self, path: list, goal_pos: tuple):
+        self.path = path[1:] or path
+        self.path_index = 0
+        self.path_goal = goal_pos
+        self.path_origin = (self.x, self.y)
+        self.path_version = self.pathfinding.obstacle_version
+        self.replans += 1
+
+    def clear_path(self):
+        self.cancel_path_request()
+        self.path = []
+        self.path_index = 0
+        self.path_goal = None
+
+    def request_path(self, goal_pos: tuple):
+        request = self.path_request
+        if request is not None and request.goal_pos != goal_pos:
+            request = None
+        if request is None:
+            self.path_request = self.path_service.submit(
+                self, (int(self.x), int(self.y)), goal_pos, self.body_radius
             )
-            if next_step:
-                self.path = [next_step]
-                self.path_index = 0
+            return
 
-        self.follow_path(other_npcs, player_pos, self.pathfinding)
+        # Until the worker answers, the NPC keeps walking its previous path.
+        if request.done():
+            path = request.result()
+            self.cancel_path_request()
+            self.set_path(path, goal_pos)
+
+    def current_waypoint(self):
+        if self.path and self.path_index < len(self.path):
+            return self.path[self.path_index]
+        return None
+
+    def cancel_path_request(self):
+        if self.path_request is not None:
+            self.path_service.cancel(self)
+            self.path_request = None
 
     def handle_chase(self, player_pos: tuple, other_npcs=None):
         if player_pos is None:
@@ -142,17 +268,22 @@ class NPC:
         dist = distance((self.x, self.y), player_pos)
 
         if dist > self.attack_range:
-            next_step = self.pathfinding.get_next_step(
-                (int(self.x), int(self.y)), player_pos
-            )
+            if self.chase_planner:
+                next_step = self.chase_planner.get_next_step(
+                    (int(self.x), int(self.y)), player_pos
+                )
+            else:
+                next_step = self.pathfinding.get_flow_step(
+                    (int(self.x), int(self.y)), player_pos, self.body_radius
+                )
             if next_step:
                 self.path = [next_step]
                 self.path_index = 0
             self.follow_path(other_npcs, player_pos, self.pathfinding)
 
-    def handle_attack(self, player_pos: tuple):
+    def handle_attack(self, player_pos: tuple, other_npcs=None):
         if self.attack_cooldown <= 0:
-            self.attack_cooldown = 60
+            self.attack_cooldown = round(self.attack_interval * self.manager.tick_rate)
             return True
         return False
 
@@ -160,15 +291,10 @@ class NPC:
         dist_from_start = distance((self.x, self.y), (self.start_x, self.start_y))
 
         if dist_from_start > 30:
-            next_step = self.pathfinding.get_next_step(
-                (int(self.x), int(self.y)), (int(self.start_x), int(self.start_y))
-            )
-            if next_step:
-                self.path = [next_step]
-                self.path_index = 0
+            self.plan_route((int(self.start_x), int(self.start_y)))
             self.follow_path(other_npcs, player_pos, self.pathfinding)
         else:
-            self.path = []
+            self.clear_path()
             self.patrol_index = 0
 
     def follow_path(self, other_npcs=None, player_pos=None, pathfinding=None):
@@ -186,54 +312,91 @@ class NPC:
             self.path_index += 1
         else:
             dx_norm, dy_norm = normalize_vector(dx, dy)
-            new_x = self.x + dx_norm * self.speed
-            new_y = self.y + dy_norm * self.speed
-            
-            collision_occurred = False
-            
-            if pathfinding:
-                grid_x = int(new_x) // pathfinding.cell_size
-                grid_y = int(new_y) // pathfinding.cell_size
-                if not pathfinding.is_walkable(grid_x, grid_y):
-                    collision_occurred = True
-            
-            if not collision_occurred and other_npcs:
-                for other_npc in other_npcs:
-                    if other_npc != self and other_npc.is_alive():
-                        if check_circle_collision(
-                            (new_x, new_y), self.radius,
+            # Never step past the waypoint; the next tick picks up the one after.
+            step = min(self.speed * self.manager.dt, dist)
+            new_x = self.x + dx_norm * step
+            new_y = self.y + dy_norm * step
+            self.move_to(new_x, new_y, other_npcs, pathfinding)
+
+    def move_to(self, new_x: float, new_y: float, other_npcs=None, pathfinding=None) -> bool:
+        # Takes the step unless it runs into a wall or another NPC; True when
+        # the NPC moved. Fields are read from the manager arrays once, since
+        # this runs for every moving NPC on every tick.
+        manager = self.manager
+        slot = self.slot
+        x = manager.x.item(slot)
+        y = manager.y.item(slot)
+        body_radius = manager.body_radius.item(slot)
+        collision_occurred = False
+        
+        position = (x, y)
+        if pathfinding and not pathfinding.can_move(position, (new_x, new_y), body_radius):
+            # Slide along the wall on whichever axis is still free.
+            if pathfinding.can_move(position, (new_x, y), body_radius):
+                new_y = y
+            elif pathfinding.can_move(position, (x, new_y), body_radius):
+                new_x = x
+            else:
+                collision_occurred = True
+        
+        if not collision_occurred and other_npcs:
+            radius = manager.radius.item(slot)
+            if isinstance(other_npcs, SpatialHash):
+                # The hash holds current positions, so only bodies within
+                # reach get the full check.
+                other_npcs = other_npcs.query_radius(
+                    (new_x, new_y), radius + other_npcs.max_radius
+                )
+            for other_npc in other_npcs:
+                if other_npc != self and other_npc.is_alive():
+                    if check_circle_collision(
+                        (new_x, new_y), radius,
+                        (other_npc.x, other_npc.y), other_npc.radius
+                    ):
+                        sep_x, sep_y = resolve_circle_collision(
+                            (new_x, new_y), radius,
                             (other_npc.x, other_npc.y), other_npc.radius
-                        ):
-                            sep_x, sep_y = resolve_circle_collision(
-                                (new_x, new_y), self.radius,
-                                (other_npc.x, other_npc.y), other_npc.radius
-                            )
-                            new_x -= sep_x
-                            new_y -= sep_y
-                            collision_occurred = True
-            
-            if not collision_occurred:
-                self.x = new_x
-                self.y = new_y
-
-    def update(self, player_pos: tuple, other_npcs=None):
+                        )
+                        new_x -= sep_x
+                        new_y -= sep_y
+                        collision_occurred = True
+        
+        if collision_occurred:
+            return False
+        manager.x[slot] = new_x
+        manager.y[slot] = new_y
+        spatial_hash = manager.spatial_hash
+        if self in spatial_hash:
+            spatial_hash.move(self, (new_x, new_y))
+            manager.hash_x[slot] = new_x
+            manager.hash_y[slot] = new_y
+        return True
+
+    def act(self, player_pos: tuple, other_npcs=None) -> bool:
+        # Runs the current state's handler once; True when an attack landed.
+        return bool(self.fsm.handle(player_pos, other_npcs))
+
+    def update(self, player_pos: tuple, other_npcs=None) -> bool:
         if self.attack_cooldown > 0:
             self.attack_cooldown -= 1
 
-        current_state = self.fsm.get_state()
-        if current_state == State.PATROL:
-            self.handle_patrol(player_pos, other_npcs)
-        elif current_state == State.CHASE:
-            self.handle_chase(player_pos, other_npcs)
-        elif current_state == State.ATTACK:
-            self.handle_attack(player_pos)
-        elif current_state == State.RETURN:
-            self.handle_return(player_pos, other_npcs)
-        
-        self.fsm.update(player_pos)
+        struck = self.act(player_pos, other_npcs)
+        self.fsm.check_transitions(self.tick_context(player_pos))
+        return struck
+
+    def render_position(self, alpha: float = 1.0) -> tuple:
+        manager = self.manager
+        slot = self.slot
+        previous_x = manager.previous_x.item(slot)
+        previous_y = manager.previous_y.item(slot)
+        return (
+            previous_x + (self.x - previous_x) * alpha,
+            previous_y + (self.y - previous_y) * alpha,
+        )
 
-    def draw(self, screen: pygame.Surface):
-        npc_pos = (int(self.x), int(self.y))
+    def draw(self, screen: pygame.Surface, alpha: float = 1.0):
+        render_x, render_y = self.render_position(alpha)
+        npc_pos = (int(render_x), int(render_y))
         current_state = self.fsm.get_state()
 
         if current_state == State.CHASE:
@@ -329,8 +492,8 @@ class NPC:
         health_bar_height = 5
         health_percent = self.health / self.max_health
         sprite_height = self.sprite_height if self.sprite else self.radius * 2
-        health_bar_x = int(self.x - health_bar_width // 2)
-        health_bar_y = int(self.y - sprite_height // 2 - 15)
+        health_bar_x = int(render_x - health_bar_width // 2)
+        health_bar_y = int(render_y - sprite_height // 2 - 15)
 
         health_bar_rect = pygame.Rect(
             health_bar_x, health_bar_y, health_bar_width, health_bar_height
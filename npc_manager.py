@@ -0,0 +1,468 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from collision import SpatialHash
+from fsm import FSM, State
+
+STATES = (State.PATROL, State.CHASE, State.ATTACK, State.RETURN)
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+PATROL, CHASE, ATTACK, RETURN = range(len(STATES))
+NO_STATE = -1
+
+RESUME_PATROL_RANGE = 50
+
+# Update interval in ticks for PATROL/RETURN NPCs by distance to the player;
+# anything beyond the last band updates every FAR_INTERVAL ticks. CHASE and
+# ATTACK always update every tick.
+LOD_BANDS = ((400.0, 1), (800.0, 4))
+FAR_INTERVAL = 8
+# Below this many NPCs the handlers cost less than scheduling and
+# extrapolating them, so every NPC updates every tick.
+LOD_MIN_NPCS = 32
+
+FIELDS = (
+    ("x", np.float64),
+    ("y", np.float64),
+    ("previous_x", np.float64),
+    ("previous_y", np.float64),
+    ("start_x", np.float64),
+    ("start_y", np.float64),
+    ("health", np.int32),
+    ("max_health", np.int32),
+    ("attack_cooldown", np.int32),
+    ("detection_range", np.float64),
+    ("attack_range", np.float64),
+    ("return_threshold", np.float64),
+    ("state", np.int8),
+    ("previous_state", np.int8),
+    ("interval", np.int16),
+    ("phase", np.int16),
+    ("velocity_x", np.float64),
+    ("velocity_y", np.float64),
+    ("target_x", np.float64),
+    ("target_y", np.float64),
+    ("hash_x", np.float64),
+    ("hash_y", np.float64),
+    ("in_hash", np.bool_),
+    ("perceived_x", np.float64),
+    ("perceived_y", np.float64),
+    ("perceived_player_x", np.float64),
+    ("perceived_player_y", np.float64),
+    ("margin", np.float64),
+    ("dirty", np.bool_),
+    ("radius", np.float64),
+    ("body_radius", np.float64),
+)
+
+CELL_KEY = 1 << 24
+
+
+def cell_keys(x: np.ndarray, y: np.ndarray, cell_size: float) -> np.ndarray:
+    # Same floor-divided cells as SpatialHash, packed into one integer.
+    return (x // cell_size).astype(np.int64) * CELL_KEY + (y // cell_size).astype(np.int64)
+
+
+class NPCManager:
+    def __init__(
+        self,
+        capacity: int = 64,
+        bucket_size: float = 96,
+        tick_rate: int = 60,
+        arrays: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.lod_enabled = True
+        self.perception_enabled = True
+        self.tick = 0
+        self.last_updated = 0
+        self.last_perceived = 0
+        self.player_present = False
+        self.count = 0
+        self.views: List = []
+        self.spatial_hash = SpatialHash(bucket_size)
+        self.pathfinding = None
+        # Caller-owned arrays (shared memory views) are used in place and
+        # never reallocated, so their capacity is fixed.
+        self.fixed_capacity = arrays is not None
+        if arrays is not None:
+            self.capacity = len(arrays["x"])
+            for name, _ in FIELDS:
+                setattr(self, name, arrays[name])
+            return
+        self.capacity = max(capacity, 1)
+        for name, dtype in FIELDS:
+            setattr(self, name, np.zeros(self.capacity, dtype=dtype))
+        self.previous_state.fill(NO_STATE)
+
+    def _grow(self):
+        if self.fixed_capacity:
+            raise ValueError(f"NPC arrays are full ({self.capacity} slots)")
+        capacity = self.capacity * 2
+        for name, dtype in FIELDS:
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[: self.capacity] = getattr(self, name)
+            setattr(self, name, grown)
+        self.previous_state[self.capacity :] = NO_STATE
+        self.capacity = capacity
+
+    def add(self, view, x: float, y: float) -> int:
+        if self.count == self.capacity:
+            self._grow()
+        slot = self.count
+        self.count += 1
+        self.views.append(view)
+        self.x[slot] = self.start_x[slot] = self.previous_x[slot] = x
+        self.y[slot] = self.start_y[slot] = self.previous_y[slot] = y
+        self.interval[slot] = 1
+        self.phase[slot] = slot % FAR_INTERVAL
+        self.in_hash[slot] = False
+        self.dirty[slot] = True
+        return slot
+
+    def attach(self, pathfinding):
+        if pathfinding is self.pathfinding:
+            return
+        if self.pathfinding is not None:
+            raise ValueError("NPCs of one manager must share a pathfinding grid")
+        self.pathfinding = pathfinding
+        pathfinding.add_obstacle_listener(self.obstacle_changed)
+
+    def obstacle_changed(self, index: int):
+        # Instead of every route going stale with the obstacle version, a new
+        # wall only invalidates routes passing next to it and an opened cell
+        # only those that found no route; the rest are carried over to the
+        # new version.
+        pathfinding = self.pathfinding
+        version = pathfinding.obstacle_version
+        blocked = not pathfinding.walkable[index]
+        center = pathfinding.index_to_world(index)
+        for view in self.views:
+            if view.path_version != version - 1:
+                continue
+            if blocked:
+                stale = view.route_passes(center, pathfinding.cell_size * 0.71 + view.body_radius)
+            else:
+                stale = view.path_goal is not None and not view.path
+            view.path_version = -1 if stale else version
+
+    def save_previous(self):
+        # Renderers interpolate between these and the current positions.
+        count = self.count
+        self.previous_x[:count] = self.x[:count]
+        self.previous_y[:count] = self.y[:count]
+
+    def alive(self) -> np.ndarray:
+        return self.health[: self.count] > 0
+
+    def tick_cooldowns(self):
+        cooldown = self.attack_cooldown[: self.count]
+        cooldown[(cooldown > 0) & self.alive()] -= 1
+
+    def perceive(self, player_pos: Optional[Tuple[float, float]]) -> np.ndarray:
+        # Slots whose guards could have flipped since they were last
+        # evaluated: written from outside (dirty), or moved together with the
+        # player farther than the margin to their nearest guard threshold.
+        # Neither distance can change by more than the two displacements.
+        count = self.count
+        if not self.perception_enabled:
+            return np.arange(count)
+        dirty = self.dirty[:count]
+        if (player_pos is not None) != self.player_present:
+            self.player_present = player_pos is not None
+            dirty.fill(True)
+        drift = np.hypot(
+            self.x[:count] - self.perceived_x[:count], self.y[:count] - self.perceived_y[:count]
+        )
+        if player_pos is not None:
+            drift += np.hypot(
+                player_pos[0] - self.perceived_player_x[:count],
+                player_pos[1] - self.perceived_player_y[:count],
+            )
+        return np.flatnonzero((dirty | (drift >= self.margin[:count])) & self.alive())
+
+    def update_states(
+        self, player_pos: Optional[Tuple[float, float]], slots: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        # The whole transition table in one pass over the arrays, comparing
+        # squared distances so no square root is taken. Within a state the
+        # assignments run in reverse priority order, so the transition the
+        # per-object FSM would try first is the one that sticks.
+        if slots is None:
+            slots = np.arange(self.count)
+        x = self.x[slots]
+        y = self.y[slots]
+        state = self.state[slots]
+        detection_range = self.detection_range[slots]
+        attack_range = self.attack_range[slots]
+        return_threshold = self.return_threshold[slots]
+        detection = detection_range**2
+        attack = attack_range**2
+
+        from_start = (x - self.start_x[slots]) ** 2 + (y - self.start_y[slots]) ** 2
+        if player_pos is None:
+            to_player = np.full(len(slots), np.inf)
+        else:
+            to_player = (x - player_pos[0]) ** 2 + (y - player_pos[1]) ** 2
+        in_detection = to_player <= detection
+        in_attack = to_player <= attack
+        should_return = ~in_detection & (from_start > return_threshold**2)
+        sighted = in_detection & self.in_view(slots, player_pos)
+
+        patrolling = state == PATROL
+        chasing = state == CHASE
+        attacking = state == ATTACK
+        returning = state == RETURN
+
+        new_state = state.copy()
+        new_state[patrolling & sighted] = CHASE
+        new_state[(chasing | attacking) & should_return] = RETURN
+        new_state[chasing & in_attack] = ATTACK
+        new_state[attacking & in_detection & ~in_attack] = CHASE
+        new_state[returning & (from_start <= RESUME_PATROL_RANGE**2)] = PATROL
+
+        changed = (new_state != state) & (self.health[slots] > 0)
+        changed_slots = slots[changed]
+        self.previous_state[changed_slots] = state[changed]
+        self.state[changed_slots] = new_state[changed]
+
+        # Margin to the nearest threshold the new state's guards compare
+        # against. An NPC that just transitioned stays awake one more tick,
+        # since its new state's guards may already hold.
+        player_distance = np.sqrt(to_player)
+        start_distance = np.sqrt(from_start)
+        margin = np.abs(player_distance - detection_range)
+        pursuing = (new_state == CHASE) | (new_state == ATTACK)
+        margin[pursuing] = np.minimum(
+            margin, np.minimum(
+                np.abs(player_distance - attack_range), np.abs(start_distance - return_threshold)
+            )
+        )[pursuing]
+        resuming = new_state == RETURN
+        margin[resuming] = np.abs(start_distance - RESUME_PATROL_RANGE)[resuming]
+        # Sight changes with cell crossings rather than with distance, so a
+        # patrol in range but out of view is checked every tick.
+        margin[(new_state == PATROL) & in_detection & ~sighted] = 0
+        self.margin[slots] = margin - 1e-6
+        self.perceived_x[slots] = x
+        self.perceived_y[slots] = y
+        if player_pos is not None:
+            self.perceived_player_x[slots] = player_pos[0]
+            self.perceived_player_y[slots] = player_pos[1]
+        self.dirty[slots] = changed
+        self.last_perceived = len(slots)
+        return changed_slots
+
+    def in_view(self, slots: np.ndarray, player_pos: Optional[Tuple[float, float]]) -> np.ndarray:
+        # Reads each NPC's cell in the player's field of view, rebuilt here
+        # only when the player changed cell, the obstacles changed or a
+        # detection range grew.
+        pathfinding = self.pathfinding
+        if pathfinding is None or player_pos is None:
+            return np.ones(len(slots), dtype=bool)
+        count = self.count
+        pathfinding.update_field_of_view(
+            player_pos, self.detection_range[:count].max() if count else 0
+        )
+        cell_size = pathfinding.cell_size
+        column = self.x[slots].astype(np.int64) // cell_size
+        row = self.y[slots].astype(np.int64) // cell_size
+        inside = (
+            (column >= 0)
+            & (column < pathfinding.grid_width)
+            & (row >= 0)
+            & (row < pathfinding.grid_height)
+        )
+        visible = np.frombuffer(pathfinding.visible, dtype=np.uint8)
+        index = (row[inside] + 1) * pathfinding.stride + column[inside] + 1
+        in_view = np.zeros(len(slots), dtype=bool)
+        in_view[inside] = visible[index] == 1
+        return in_view
+
+    def sync_spatial_hash(self):
+        # Catches positions written outside of movement (respawns, resets)
+        # and drops dead NPCs. NPC.move_to() updates the hash and hash_x/y
+        # as it moves, so only slots whose position changed some other way
+        # or that died or came back are touched here.
+        spatial_hash = self.spatial_hash
+        count = self.count
+        views = self.views
+        x = self.x[:count]
+        y = self.y[:count]
+        alive = self.alive()
+        in_hash = self.in_hash[:count]
+        if self.perception_enabled:
+            slots = np.flatnonzero(
+                (alive & ((x != self.hash_x[:count]) | (y != self.hash_y[:count])))
+                | (alive != in_hash)
+            )
+        else:
+            slots = np.arange(count)
+        for slot, position_x, position_y, live in zip(
+            slots.tolist(), x[slots].tolist(), y[slots].tolist(), alive[slots].tolist()
+        ):
+            view = views[slot]
+            if live:
+                spatial_hash.insert(view, (position_x, position_y), view.radius)
+            elif view in spatial_hash:
+                spatial_hash.remove(view)
+        in_hash[slots] = alive[slots]
+        self.hash_x[slots] = x[slots]
+        self.hash_y[slots] = y[slots]
+
+    def scheduling(self) -> bool:
+        return self.lod_enabled and self.count >= LOD_MIN_NPCS
+
+    def update_intervals(self, player_pos: Optional[Tuple[float, float]]):
+        count = self.count
+        interval = self.interval[:count]
+        if not self.scheduling():
+            interval.fill(1)
+            return
+        if player_pos is None:
+            interval.fill(FAR_INTERVAL)
+        else:
+            to_player = (self.x[:count] - player_pos[0]) ** 2 + (self.y[:count] - player_pos[1]) ** 2
+            interval.fill(FAR_INTERVAL)
+            for band, band_interval in reversed(LOD_BANDS):
+                interval[to_player <= band * band] = band_interval
+        state = self.state[:count]
+        interval[(state == CHASE) | (state == ATTACK)] = 1
+
+    def due(self) -> np.ndarray:
+        # Phase offsets spread NPCs sharing an interval over its ticks, so
+        # the expensive updates of a crowd never land on the same frame.
+        count = self.count
+        return (self.tick + self.phase[:count]) % self.interval[:count] == 0
+
+    def extrapolate(self, idle: np.ndarray):
+        # NPCs skipped this tick keep their last velocity, clamped so they
+        # stop on their current waypoint instead of overshooting a turn. The
+        # step goes through NPC.move_to(), the same wall and crowd checks
+        # follow_path uses; NPCs that cannot move stop until their next
+        # update.
+        count = self.count
+        slots = np.flatnonzero(
+            idle & ((self.velocity_x[:count] != 0) | (self.velocity_y[:count] != 0))
+        )
+        if not len(slots):
+            return
+        x = self.x[slots]
+        y = self.y[slots]
+        velocity_x = self.velocity_x[slots]
+        velocity_y = self.velocity_y[slots]
+        target_x = self.target_x[slots]
+        target_y = self.target_y[slots]
+        arrive = (target_x - x) ** 2 + (target_y - y) ** 2 <= velocity_x**2 + velocity_y**2
+        new_x = np.where(arrive, target_x, x + velocity_x)
+        new_y = np.where(arrive, target_y, y + velocity_y)
+
+        views = self.views
+        spatial_hash = self.spatial_hash
+        pathfinding = self.pathfinding
+        stopped = []
+        for slot, to_x, to_y, arrived in zip(
+            slots.tolist(), new_x.tolist(), new_y.tolist(), arrive.tolist()
+        ):
+            if not views[slot].move_to(to_x, to_y, spatial_hash, pathfinding) or arrived:
+                stopped.append(slot)
+        self.velocity_x[stopped] = 0
+        self.velocity_y[stopped] = 0
+
+    def update(self, player_pos: Optional[Tuple[float, float]]) -> List:
+        # One handler call per live NPC that is due this tick, extrapolated
+        # movement for the rest, then one vectorized transition pass for
+        # everybody; returns the NPCs whose attack landed this tick.
+        self.tick_cooldowns()
+        self.sync_spatial_hash()
+        self.update_intervals(player_pos)
+        alive = self.alive()
+        count = self.count
+        views = self.views
+        attackers = []
+        if not self.scheduling():
+            due_slots = np.flatnonzero(alive)
+            for slot in due_slots.tolist():
+                view = views[slot]
+                if view.act(player_pos, self.spatial_hash):
+                    attackers.append(view)
+            # Nothing is extrapolated, so no velocity carries over to the
+            # ticks after scheduling resumes.
+            self.velocity_x[:count] = 0
+            self.velocity_y[:count] = 0
+        else:
+            due = alive & self.due()
+            before_x = self.x[:count].copy()
+            before_y = self.y[:count].copy()
+            due_slots = np.flatnonzero(due)
+            for slot in due_slots.tolist():
+                view = views[slot]
+                if view.act(player_pos, self.spatial_hash):
+                    attackers.append(view)
+                target = view.current_waypoint()
+                if target is None:
+                    self.target_x[slot] = self.x[slot]
+                    self.target_y[slot] = self.y[slot]
+                else:
+                    self.target_x[slot], self.target_y[slot] = target
+            self.velocity_x[due_slots] = self.x[due_slots] - before_x[due_slots]
+            self.velocity_y[due_slots] = self.y[due_slots] - before_y[due_slots]
+            self.extrapolate(alive & ~due)
+        self.last_updated = len(due_slots)
+        self.tick += 1
+
+        for slot in self.update_states(player_pos, self.perceive(player_pos)).tolist():
+            views[slot].fsm.fire_hooks(
+                STATES[self.previous_state[slot]], STATES[self.state[slot]]
+            )
+        return attackers
+
+    def handler_times(self) -> Dict[State, Tuple[int, float]]:
+        totals = {state: [0, 0.0] for state in STATES}
+        for view in self.views:
+            fsm = view.fsm
+            for state in STATES:
+                totals[state][0] += fsm.handler_calls[state]
+                totals[state][1] += fsm.handler_seconds[state]
+        return {state: tuple(total) for state, total in totals.items()}
+
+
+class ManagedFSM(FSM):
+    def __init__(self, manager: NPCManager, slot: int, initial_state: State = State.PATROL):
+        self.manager = manager
+        self.slot = slot
+        super().__init__(initial_state)
+
+    @property
+    def current_state(self) -> State:
+        return STATES[self.manager.state[self.slot]]
+
+    @current_state.setter
+    def current_state(self, state: State):
+        self.manager.state[self.slot] = STATE_CODES[state]
+        self.manager.dirty[self.slot] = True
+
+    @property
+    def previous_state(self) -> Optional[State]:
+        code = self.manager.previous_state[self.slot]
+        return None if code == NO_STATE else STATES[code]
+
+    @previous_state.setter
+    def previous_state(self, state: Optional[State]):
+        self.manager.previous_state[self.slot] = NO_STATE if state is None else STATE_CODES[state]
+
+
+def array_field(name: str, wakes: bool = False):
+    # wakes=True for fields the transition guards read, so a write from
+    # outside the transition pass gets the NPC re-evaluated next tick.
+    def get_value(view):
+        return getattr(view.manager, name).item(view.slot)
+
+    def set_value(view, value):
+        manager = view.manager
+        getattr(manager, name)[view.slot] = value
+        if wakes:
+            manager.dirty[view.slot] = True
+
+    return property(get_value, set_value)
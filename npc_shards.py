@@ -0,0 +1,333 @@
+import gc
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from npc import NPC
+from npc_manager import CELL_KEY, FIELDS, NO_STATE, NPCManager, cell_keys
+from path_service import TimeSlicedPathService
+from pathfinding import Pathfinding
+
+SHARED_FIELDS = FIELDS + (
+    ("snapshot_x", np.float64),
+    ("snapshot_y", np.float64),
+    ("struck", np.int8),
+)
+
+RUNNING, RESET, GRID_VERSION = range(3)
+
+
+class SharedNPCArrays:
+    def __init__(self, capacity: int, grid_cells: int, name: Optional[str] = None):
+        # One block holds every per-NPC field, the published player position,
+        # control flags and the walkable grid; name=None creates it, a name
+        # attaches to the block another process created.
+        layout = [(field, dtype, capacity) for field, dtype in SHARED_FIELDS]
+        layout += [
+            ("player", np.float64, 2),
+            ("flags", np.int64, 3),
+            ("walkable", np.uint8, grid_cells),
+        ]
+        offsets = []
+        size = 0
+        for _, dtype, length in layout:
+            offsets.append(size)
+            size += -(-np.dtype(dtype).itemsize * length // 8) * 8
+        self.capacity = capacity
+        self.grid_cells = grid_cells
+        self.memory = SharedMemory(name=name, create=name is None, size=max(size, 8))
+        self.name = self.memory.name
+        self.arrays: Dict[str, np.ndarray] = {
+            field: np.ndarray(length, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            for (field, dtype, length), offset in zip(layout, offsets)
+        }
+        if name is None:
+            self.arrays["previous_state"].fill(NO_STATE)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.arrays[field]
+
+    def close(self):
+        # Every view into the buffer has to be gone before the mapping can be
+        # closed.
+        self.arrays.clear()
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+
+class RemoteNPC:
+    __slots__ = ("slot", "x", "y", "radius")
+
+    def __init__(self, slot: int, radius: float):
+        self.slot = slot
+        self.x = 0.0
+        self.y = 0.0
+        self.radius = radius
+
+    def is_alive(self) -> bool:
+        return True
+
+
+class NPCShard:
+    def __init__(
+        self,
+        shared: SharedNPCArrays,
+        start: int,
+        stop: int,
+        grid: Tuple[int, int, int, str],
+        radii: Sequence[float],
+        tick_rate: int = 60,
+    ):
+        self.shared = shared
+        self.start = start
+        self.stop = stop
+        grid_width, grid_height, cell_size, algorithm = grid
+        self.pathfinding = Pathfinding(grid_width, grid_height, cell_size, algorithm=algorithm)
+        self.sync_grid()
+        self.path_service = TimeSlicedPathService(self.pathfinding)
+
+        # The shard's manager runs over slices of the shared arrays, so slot
+        # i here is global slot start + i. Building the NPC objects writes
+        # their defaults into those slices; the values the main process set
+        # up are put back afterwards.
+        arrays = {field: shared[field][start:stop] for field, _ in FIELDS}
+        initial = {field: array.copy() for field, array in arrays.items()}
+        self.manager = NPCManager(tick_rate=tick_rate, arrays=arrays)
+        self.npcs = [
+            NPC(
+                initial["start_x"][slot],
+                initial["start_y"][slot],
+                self.pathfinding,
+                path_service=self.path_service,
+                manager=self.manager,
+                radius=radii[start + slot],
+            )
+            for slot in range(stop - start)
+        ]
+        for field, array in arrays.items():
+            array[:] = initial[field]
+        self.struck = shared["struck"][start:stop]
+
+        count = len(radii)
+        self.remote_slots = np.r_[0:start, stop:count].astype(np.int64)
+        self.remote = [RemoteNPC(slot, radii[slot]) for slot in self.remote_slots.tolist()]
+        self.remote_near = np.zeros(len(self.remote), dtype=bool)
+        spatial_hash = self.manager.spatial_hash
+        max_step = max((npc.speed for npc in self.npcs), default=0) * self.manager.dt
+        self.reach = int(np.ceil((2 * max(radii, default=0) + max_step) / spatial_hash.cell_size))
+
+    def sync_grid(self):
+        shared = self.shared
+        self.pathfinding.load_snapshot(
+            (int(shared["flags"][GRID_VERSION]), shared["walkable"].tobytes())
+        )
+
+    def sync_remote(self):
+        # NPCs of other shards collide at their start-of-tick positions, read
+        # from a snapshot nobody writes during the tick, so the outcome does
+        # not depend on how the workers are scheduled. Only those in buckets
+        # this shard's NPCs can reach are put into the spatial hash.
+        shared = self.shared
+        manager = self.manager
+        spatial_hash = manager.spatial_hash
+        cell_size = spatial_hash.cell_size
+        count = manager.count
+        alive = manager.alive()
+        own = cell_keys(manager.x[:count][alive], manager.y[:count][alive], cell_size)
+        reach = range(-self.reach, self.reach + 1)
+        reachable = np.unique(
+            np.concatenate([own + dx * CELL_KEY + dy for dx in reach for dy in reach])
+        )
+
+        slots = self.remote_slots
+        remote_x = shared["snapshot_x"][slots]
+        remote_y = shared["snapshot_y"][slots]
+        near = np.isin(cell_keys(remote_x, remote_y, cell_size), reachable) & (
+            shared["health"][slots] > 0
+        )
+        remote = self.remote
+        for index in np.flatnonzero(self.remote_near & ~near).tolist():
+            spatial_hash.remove(remote[index])
+        for index, x, y in zip(
+            np.flatnonzero(near).tolist(), remote_x[near].tolist(), remote_y[near].tolist()
+        ):
+            proxy = remote[index]
+            proxy.x = x
+            proxy.y = y
+            spatial_hash.insert(proxy, (x, y), proxy.radius)
+        self.remote_near = near
+
+    def step(self):
+        shared = self.shared
+        flags = shared["flags"]
+        if flags[RESET]:
+            for npc in self.npcs:
+                npc.clear_path()
+        if flags[GRID_VERSION] != self.pathfinding.obstacle_version:
+            self.sync_grid()
+        player_pos = tuple(shared["player"].tolist())
+        self.pathfinding.update_flow_field(player_pos)
+        self.sync_remote()
+        attackers = self.manager.update(player_pos)
+        struck = self.struck
+        struck.fill(0)
+        for npc in attackers:
+            struck[npc.slot] = 1
+        self.path_service.update()
+
+    def shutdown(self):
+        self.path_service.shutdown()
+
+
+def _run_shard(name, capacity, grid_cells, start, stop, grid, radii, tick_rate, barrier):
+    shared = SharedNPCArrays(capacity, grid_cells, name)
+    shard = None
+    try:
+        shard = NPCShard(shared, start, stop, grid, radii, tick_rate)
+        barrier.wait()
+        while True:
+            barrier.wait()
+            if not shared["flags"][RUNNING]:
+                break
+            shard.step()
+            barrier.wait()
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        if shard is not None:
+            shard.shutdown()
+        # NPC views and their FSM hooks form reference cycles that still
+        # hold slices of the block.
+        del shard
+        gc.collect()
+        shared.close()
+
+
+class ShardedNPCs:
+    def __init__(
+        self,
+        pathfinding: Pathfinding,
+        spawns: Sequence[Tuple[float, float]],
+        workers: int,
+        tick_rate: int = 60,
+        npc_sprites: Optional[Sequence[Tuple[str, object]]] = None,
+        npc_radii: Optional[Sequence[int]] = None,
+        timeout: Optional[float] = 30.0,
+    ):
+        # NPC state lives in shared memory. Each worker process owns a
+        # contiguous range of slots and steps it against its own copy of the
+        # grid; the main process keeps NPC views over the same arrays, so
+        # rendering and damage read worker results without copying. A tick
+        # is two barrier phases: workers read inputs and step their shard,
+        # then the main process snapshots positions for the next tick.
+        count = len(spawns)
+        self.pathfinding = pathfinding
+        self.timeout = timeout
+        self.shared = SharedNPCArrays(count, len(pathfinding.walkable))
+        self.manager = NPCManager(
+            tick_rate=tick_rate,
+            arrays={field: self.shared[field] for field, _ in FIELDS},
+        )
+        self.npcs: List[NPC] = []
+        for i, (x, y) in enumerate(spawns):
+            sprite_name, sprite = npc_sprites[i % len(npc_sprites)] if npc_sprites else (None, None)
+            self.npcs.append(
+                NPC(
+                    x,
+                    y,
+                    pathfinding,
+                    sprite=sprite,
+                    sprite_name=sprite_name,
+                    manager=self.manager,
+                    radius=npc_radii[i] if npc_radii else None,
+                )
+            )
+        self.publish_grid(force=True)
+        self.snapshot()
+        self.shared["flags"][RUNNING] = 1
+
+        workers = max(1, min(workers, count))
+        self.bounds = [count * worker // workers for worker in range(workers + 1)]
+        grid = (
+            pathfinding.grid_width,
+            pathfinding.grid_height,
+            pathfinding.cell_size,
+            pathfinding.algorithm,
+        )
+        radii = [npc.radius for npc in self.npcs]
+        context = multiprocessing.get_context()
+        self.barrier = context.Barrier(workers + 1)
+        self.processes = []
+        for worker in range(workers):
+            process = context.Process(
+                target=_run_shard,
+                args=(
+                    self.shared.name,
+                    count,
+                    self.shared.grid_cells,
+                    self.bounds[worker],
+                    self.bounds[worker + 1],
+                    grid,
+                    radii,
+                    tick_rate,
+                    self.barrier,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+        self.barrier.wait(self.timeout)
+
+    @property
+    def workers(self) -> int:
+        return len(self.processes)
+
+    def publish_grid(self, force: bool = False):
+        flags = self.shared["flags"]
+        if force or flags[GRID_VERSION] != self.pathfinding.obstacle_version:
+            self.shared["walkable"][:] = np.frombuffer(self.pathfinding.walkable, dtype=np.uint8)
+            flags[GRID_VERSION] = self.pathfinding.obstacle_version
+
+    def snapshot(self):
+        count = self.manager.count
+        self.shared["snapshot_x"][:count] = self.manager.x[:count]
+        self.shared["snapshot_y"][:count] = self.manager.y[:count]
+
+    def reset(self):
+        # Positions and states were rewritten through the views between
+        # ticks; workers drop their paths on the next tick.
+        self.shared["flags"][RESET] = 1
+        self.snapshot()
+
+    def step(self, player_pos: Tuple[float, float]) -> List[NPC]:
+        shared = self.shared
+        self.publish_grid()
+        shared["player"][:] = player_pos
+        self.barrier.wait(self.timeout)
+        self.barrier.wait(self.timeout)
+        shared["flags"][RESET] = 0
+        self.snapshot()
+        npcs = self.npcs
+        return [npcs[slot] for slot in np.flatnonzero(shared["struck"][: self.manager.count]).tolist()]
+
+    def close(self):
+        if not self.processes:
+            return
+        self.shared["flags"][RUNNING] = 0
+        if not self.barrier.broken:
+            self.barrier.wait(self.timeout)
+        for process in self.processes:
+            process.join(self.timeout)
+        self.processes = []
+        # The views keep working on a private copy of the final state once
+        # the shared block is gone.
+        manager = self.manager
+        for field, _ in FIELDS:
+            setattr(manager, field, getattr(manager, field).copy())
+        self.shared.close()
+        self.shared.unlink()
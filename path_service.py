@@ -0,0 +1,261 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from pathfinding import SEARCH_IN_PROGRESS, PathSearch, Pathfinding
+
+_worker_state = threading.local()
+
+
+def _compute_path(
+    config: Tuple[int, int, int, str],
+    snapshot: Tuple[int, bytes],
+    start_pos: Tuple[int, int],
+    goal_pos: Tuple[int, int],
+    radius: float,
+) -> List[Tuple[int, int]]:
+    # Search buffers and the path cache are not thread safe, so every worker
+    # keeps its own Pathfinding and syncs it to the submitted grid snapshot.
+    pathfinding = getattr(_worker_state, "pathfinding", None)
+    if pathfinding is None or _worker_state.config != config:
+        grid_width, grid_height, cell_size, algorithm = config
+        pathfinding = Pathfinding(grid_width, grid_height, cell_size, algorithm=algorithm)
+        _worker_state.pathfinding = pathfinding
+        _worker_state.config = config
+        pathfinding.load_snapshot(snapshot)
+    elif pathfinding.obstacle_version != snapshot[0]:
+        pathfinding.load_snapshot(snapshot)
+    return pathfinding.find_path(start_pos, goal_pos, radius)
+
+
+class PathRequest:
+    def __init__(
+        self,
+        key: Optional[Tuple[int, int, int, float]],
+        future: Future,
+        start_pos: Tuple[int, int],
+        goal_pos: Tuple[int, int],
+    ):
+        self.key = key
+        self.future = future
+        self.start_pos = start_pos
+        self.goal_pos = goal_pos
+
+    def done(self) -> bool:
+        return self.future.done() and not self.future.cancelled()
+
+    def result(self) -> Optional[List[Tuple[int, int]]]:
+        if not self.done():
+            return None
+        return self.future.result()
+
+
+class PathRequestQueue(ABC):
+    def __init__(self, pathfinding: Pathfinding):
+        self.pathfinding = pathfinding
+        self._owners: Dict[Hashable, PathRequest] = {}
+        self._pending: Dict[Tuple[int, int, int, float], List] = {}
+        self.submitted = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+
+    @abstractmethod
+    def _start_search(
+        self,
+        start: int,
+        goal: int,
+        start_pos: Tuple[int, int],
+        goal_pos: Tuple[int, int],
+        radius: float,
+    ) -> Future:
+        # Returns a future that resolves to the world-space path.
+        ...
+
+    def submit(
+        self,
+        owner: Hashable,
+        start_pos: Tuple[int, int],
+        goal_pos: Tuple[int, int],
+        radius: float = 0,
+    ) -> PathRequest:
+        pathfinding = self.pathfinding
+        endpoints = pathfinding.resolve_endpoints(start_pos, goal_pos)
+        if endpoints is None or endpoints[0] == endpoints[1]:
+            self.cancel(owner)
+            future = Future()
+            future.set_result([goal_pos] if endpoints else [])
+            request = PathRequest(None, future, start_pos, goal_pos)
+            self._owners[owner] = request
+            return request
+
+        key = (endpoints[0], endpoints[1], pathfinding.obstacle_version, radius)
+        previous = self._owners.get(owner)
+        if previous is not None and previous.key == key:
+            return previous
+        self.cancel(owner)
+
+        entry = self._pending.get(key)
+        if entry is None:
+            future = self._start_search(endpoints[0], endpoints[1], start_pos, goal_pos, radius)
+            entry = self._pending[key] = [future, 0]
+            self.submitted += 1
+        else:
+            self.deduplicated += 1
+        entry[1] += 1
+
+        request = PathRequest(key, entry[0], start_pos, goal_pos)
+        self._owners[owner] = request
+        return request
+
+    def get_request(self, owner: Hashable) -> Optional[PathRequest]:
+        return self._owners.get(owner)
+
+    def cancel(self, owner: Hashable):
+        request = self._owners.pop(owner, None)
+        if request is None or request.key is None:
+            return
+        entry = self._pending.get(request.key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._pending[request.key]
+            if entry[0].cancel():
+                self.cancelled += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "cancelled": self.cancelled,
+            "pending": sum(1 for future, _ in self._pending.values() if not future.done()),
+        }
+
+    @abstractmethod
+    def update(self):
+        # Called once per frame to advance pending searches.
+        ...
+
+    @abstractmethod
+    def shutdown(self, wait: bool = False):
+        ...
+
+
+class PathRequestService(PathRequestQueue):
+    def __init__(
+        self,
+        pathfinding: Pathfinding,
+        workers: int = 2,
+        executor: Optional[Executor] = None,
+    ):
+        super().__init__(pathfinding)
+        # Threads share the GIL with the game loop, but a long search no
+        # longer blocks a whole frame. A ProcessPoolExecutor can be passed in
+        # instead; requests only carry picklable grid snapshots.
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="pathfinding"
+        )
+        self._snapshot: Optional[Tuple[int, bytes]] = None
+
+    def _get_snapshot(self) -> Tuple[int, bytes]:
+        if self._snapshot is None or self._snapshot[0] != self.pathfinding.obstacle_version:
+            self._snapshot = self.pathfinding.snapshot()
+        return self._snapshot
+
+    def _start_search(
+        self,
+        start: int,
+        goal: int,
+        start_pos: Tuple[int, int],
+        goal_pos: Tuple[int, int],
+        radius: float,
+    ) -> Future:
+        return self.executor.submit(
+            _compute_path, self._config(), self._get_snapshot(), start_pos, goal_pos, radius
+        )
+
+    def _config(self) -> Tuple[int, int, int, str]:
+        pathfinding = self.pathfinding
+        return (
+            pathfinding.grid_width,
+            pathfinding.grid_height,
+            pathfinding.cell_size,
+            pathfinding.algorithm,
+        )
+
+    def update(self):
+        # Executor workers complete their futures on their own.
+        pass
+
+    def shutdown(self, wait: bool = False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class TimeSlicedPathService(PathRequestQueue):
+    def __init__(self, pathfinding: Pathfinding, node_budget: int = 600, min_slice: int = 32):
+        super().__init__(pathfinding)
+        self.node_budget = node_budget
+        self.min_slice = min_slice
+        self._queue: "deque[Tuple[PathSearch, Future]]" = deque()
+        self.last_frame_expanded = 0
+
+    def _start_search(
+        self,
+        start: int,
+        goal: int,
+        start_pos: Tuple[int, int],
+        goal_pos: Tuple[int, int],
+        radius: float,
+    ) -> Future:
+        pathfinding = self.pathfinding
+        future = Future()
+        path = pathfinding.direct_path(start, goal, radius)
+        if path is not None:
+            future.set_result(self._to_world(path))
+            return future
+
+        cached = pathfinding.cache_lookup(start, goal, radius)
+        if cached is not None:
+            path, position = cached
+            future.set_result(self._to_world(pathfinding.smooth_path(path[position:], radius)))
+        else:
+            self._queue.append((pathfinding.begin_search(start, goal, radius), future))
+        return future
+
+    def _to_world(self, path: List[int]) -> List[Tuple[int, int]]:
+        return [self.pathfinding.index_to_world(index) for index in path]
+
+    def update(self):
+        # One shared budget per frame, handed out round-robin: every queued
+        # search gets an equal slice, and the rotation carries over to the
+        # next frame so no NPC is starved by the ones ahead of it.
+        queue = self._queue
+        budget = self.node_budget
+        while queue and budget > 0:
+            search, future = queue.popleft()
+            if future.cancelled():
+                continue
+            slice_budget = min(budget, max(self.min_slice, budget // (len(queue) + 1)))
+            status = search.step(slice_budget)
+            budget -= search.last_expanded
+            if status == SEARCH_IN_PROGRESS:
+                queue.append((search, future))
+            else:
+                future.set_result(
+                    self._to_world(self.pathfinding.smooth_path(search.path, search.radius))
+                )
+        self.last_frame_expanded = self.node_budget - budget
+
+    def shutdown(self, wait: bool = False):
+        # Searches only advance in update(), so there is nothing to wait for.
+        for _, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = super().get_stats()
+        stats["queued"] = len(self._queue)
+        stats["last_frame_expanded"] = self.last_frame_expanded
+        return stats
@@ -1,151 +1,1315 @@
 import heapq
-from typing import List, Tuple, Optional, Set
-from dataclasses import dataclass
+import math
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Tuple, Optional, Set
 
+import numpy as np
 
-@dataclass
-class Node:
-    x: int
-    y: int
-    g: float = 0
-    h: float = 0
-    parent: Optional["Node"] = None
+from telemetry import SearchTelemetry
 
-    @property
-    def f(self) -> float:
-        return self.g + self.h
+FLOW_UNREACHABLE = 1 << 30
+# (xx, xy, yx, yy) transforms mapping the first shadowcasting octant onto
+# each of the eight.
+FOV_OCTANTS = (
+    (1, 0, 0, 1),
+    (0, 1, 1, 0),
+    (0, -1, 1, 0),
+    (-1, 0, 0, 1),
+    (-1, 0, 0, -1),
+    (0, -1, -1, 0),
+    (0, 1, -1, 0),
+    (1, 0, 0, -1),
+)
+ALGORITHMS = ("astar", "jps")
+TIE_BITS = 31
+STAMP_LIMIT = (1 << 31) - 3
 
-    def __lt__(self, other):
-        return self.f < other.f
-
-    def __eq__(self, other):
-        return self.x == other.x and self.y == other.y
-
-    def __hash__(self):
-        return hash((self.x, self.y))
+SEARCH_IN_PROGRESS = "in_progress"
+SEARCH_FOUND = "found"
+SEARCH_FAILED = "failed"
 
 
 class Pathfinding:
-    def __init__(self, grid_width: int, grid_height: int, cell_size: int):
+    def __init__(
+        self,
+        grid_width: int,
+        grid_height: int,
+        cell_size: int,
+        cache_size: int = 512,
+        algorithm: str = "astar",
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown pathfinding algorithm: {algorithm}")
         self.grid_width = grid_width
         self.grid_height = grid_height
         self.cell_size = cell_size
         self.obstacles: Set[Tuple[int, int]] = set()
+        self.obstacle_version = 0
+        self.obstacle_listeners: List[Callable[[int], None]] = []
+        # JPS expands about half the nodes A* does, but each expansion runs
+        # jump scans cell by cell in Python, so on game-sized grids it loses
+        # in wall time (`benchmark.py jps`). A* stays the default.
+        self.algorithm = algorithm
+        self.landmarks = None
+        self.last_expanded = 0
+        self.last_pushed = 0
+        self.last_heap_peak = 0
+        self.telemetry = SearchTelemetry()
+        self.telemetry_enabled = False
+
+        # Cells live in a buffer padded with a ring of blocked cells, so the
+        # neighbour loop never needs bounds checks.
+        self.stride = grid_width + 2
+        self.size = self.stride * (grid_height + 2)
+        self.walkable = bytearray(self.size)
+        for grid_y in range(grid_height):
+            row = self.cell_index(0, grid_y)
+            self.walkable[row : row + grid_width] = b"\x01" * grid_width
+
+        self.neighbor_offsets = (
+            (self.stride, 10),
+            (1, 10),
+            (-self.stride, 10),
+            (-1, 10),
+            (self.stride + 1, 14),
+            (1 - self.stride, 14),
+            (self.stride - 1, 14),
+            (-self.stride - 1, 14),
+        )
+
+        self.diagonal_sides = {
+            self.stride + 1: (1, self.stride),
+            1 - self.stride: (1, -self.stride),
+            self.stride - 1: (-1, self.stride),
+            -self.stride - 1: (-1, -self.stride),
+        }
+
+        self.cell_x = array("l", (i % self.stride - 1 for i in range(self.size)))
+        self.cell_y = array("l", (i // self.stride - 1 for i in range(self.size)))
+
+        self._index_bits = self.size.bit_length()
+        self._index_mask = (1 << self._index_bits) - 1
+        # Scratch buffers shared by every search. Entries are only trusted
+        # when their state stamp belongs to the running search, so nothing
+        # is cleared between calls. Plain lists, because CPython indexes
+        # them faster than array.array in the hot loop.
+        self._g = [0] * self.size
+        self._parent = [0] * self.size
+        self._state = [0] * self.size
+        self._generation = 0
+        self._column = [index % self.stride for index in range(self.size)]
+        self._row = [index // self.stride for index in range(self.size)]
+
+        self.cache_size = cache_size
+        # Paths are keyed (start, goal, radius): a body radius searches its
+        # own clearance mask, so paths for different radii never mix.
+        self.path_cache: "OrderedDict[Tuple[int, int, float], List[int]]" = OrderedDict()
+        self._cache_index: Dict[Tuple[int, int, float], Tuple[Tuple[int, int, float], int]] = {}
+        self._cache_version = self.obstacle_version
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+        # Chase fields per body radius: radius -> (goal, obstacle version, field).
+        self.flow_fields: Dict[float, Tuple[Optional[int], int, List[int]]] = {}
+        self.flow_field_builds = 0
+
+        self.visible = bytearray(self.size)
+        self.field_of_view_builds = 0
+        self._view_origin: Optional[int] = None
+        self._view_version = -1
+        self._view_radius = 0
+
+        # Connected components of walkable cells. Labels are union-find
+        # nodes, so merges are a single link; splits relabel only the
+        # pieces cut off from the rest.
+        self.component = array("l", (0 if cell else -1 for cell in self.walkable))
+        self._component_parent: List[int] = [0]
+        self.component_relabels = 0
+
+        # Distance transform of the obstacle grid: for every cell, the
+        # nearest blocked cell and the squared distance to it in half-cell
+        # units. Built on first use, then patched locally on every change.
+        self.wall_site: Optional[array] = None
+        self.wall_distance: Optional[array] = None
+        self._clearance_masks: Dict[float, Tuple[int, bytearray]] = {}
+
+    def cell_index(self, grid_x: int, grid_y: int) -> int:
+        return (grid_y + 1) * self.stride + grid_x + 1
+
+    def index_to_cell(self, index: int) -> Tuple[int, int]:
+        return self.cell_x[index], self.cell_y[index]
+
+    def index_to_world(self, index: int) -> Tuple[int, int]:
+        half = self.cell_size // 2
+        return (
+            self.cell_x[index] * self.cell_size + half,
+            self.cell_y[index] * self.cell_size + half,
+        )
+
+    def world_to_index(self, pos: Tuple[int, int]) -> Optional[int]:
+        grid_x = int(pos[0]) // self.cell_size
+        grid_y = int(pos[1]) // self.cell_size
+        if not self.in_bounds(grid_x, grid_y):
+            return None
+        return self.cell_index(grid_x, grid_y)
+
+    def in_bounds(self, grid_x: int, grid_y: int) -> bool:
+        return 0 <= grid_x < self.grid_width and 0 <= grid_y < self.grid_height
 
     def add_obstacle(self, x: int, y: int):
         grid_x = x // self.cell_size
         grid_y = y // self.cell_size
         self.obstacles.add((grid_x, grid_y))
+        if self.in_bounds(grid_x, grid_y):
+            index = self.cell_index(grid_x, grid_y)
+            if self.walkable[index]:
+                self.walkable[index] = 0
+                self.obstacle_version += 1
+                self._split_component(index)
+                if self.wall_site is not None:
+                    self._add_wall(index)
+                for listener in self.obstacle_listeners:
+                    listener(index)
 
     def remove_obstacle(self, x: int, y: int):
         grid_x = x // self.cell_size
         grid_y = y // self.cell_size
         self.obstacles.discard((grid_x, grid_y))
+        if self.in_bounds(grid_x, grid_y):
+            index = self.cell_index(grid_x, grid_y)
+            if not self.walkable[index]:
+                self.walkable[index] = 1
+                self.obstacle_version += 1
+                self._merge_component(index)
+                if self.wall_site is not None:
+                    self._remove_wall(index)
+                for listener in self.obstacle_listeners:
+                    listener(index)
+
+    def snapshot(self) -> Tuple[int, bytes]:
+        return self.obstacle_version, bytes(self.walkable)
+
+    def load_snapshot(self, snapshot: Tuple[int, bytes]):
+        version, walkable = snapshot
+        self.walkable[:] = walkable
+        self.obstacle_version = version
+        self.label_components()
+        self.wall_site = None
+        self.wall_distance = None
+
+    def label_components(self):
+        walkable = self.walkable
+        offsets = self.neighbor_offsets
+        component = self.component = array("l", [-1]) * self.size
+        self._component_parent = []
+        for index in range(self.size):
+            if not walkable[index] or component[index] >= 0:
+                continue
+            label = self._new_component()
+            component[index] = label
+            frontier = [index]
+            while frontier:
+                current = frontier.pop()
+                for offset, _ in offsets:
+                    neighbor = current + offset
+                    if walkable[neighbor] and component[neighbor] < 0:
+                        component[neighbor] = label
+                        frontier.append(neighbor)
+
+    def _new_component(self) -> int:
+        self._component_parent.append(len(self._component_parent))
+        return len(self._component_parent) - 1
+
+    def _find_component(self, label: int) -> int:
+        parent = self._component_parent
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    def _site_distance(self, index: int, site: int) -> int:
+        cell_x = self.cell_x
+        cell_y = self.cell_y
+        dx = 2 * abs(cell_x[index] - cell_x[site]) - 1
+        dy = 2 * abs(cell_y[index] - cell_y[site]) - 1
+        dx = dx if dx > 0 else 0
+        dy = dy if dy > 0 else 0
+        return dx * dx + dy * dy
+
+    def _ensure_wall_distance(self):
+        if self.wall_site is not None:
+            return
+        walkable = self.walkable
+        blocked = [index for index in range(self.size) if not walkable[index]]
+        self.wall_site = array("l", range(self.size))
+        self.wall_distance = array("l", [FLOW_UNREACHABLE]) * self.size
+        for index in blocked:
+            self.wall_distance[index] = 0
+        self._propagate_walls(blocked)
+
+    def _propagate_walls(self, frontier: List[int]):
+        walkable = self.walkable
+        site_of = self.wall_site
+        distance = self.wall_distance
+        offsets = self.neighbor_offsets
+        size = self.size
+        site_distance = self._site_distance
+        shift = self._index_bits
+        mask = self._index_mask
+        push = heapq.heappush
+        pop = heapq.heappop
+
+        open_set = [(distance[index] << shift) | index for index in frontier]
+        heapq.heapify(open_set)
+        while open_set:
+            key = pop(open_set)
+            current = key & mask
+            if key >> shift != distance[current]:
+                continue
+            site = site_of[current]
+            for offset, _ in offsets:
+                neighbor = current + offset
+                if neighbor < 0 or neighbor >= size or not walkable[neighbor]:
+                    continue
+                new_distance = site_distance(neighbor, site)
+                if new_distance < distance[neighbor]:
+                    distance[neighbor] = new_distance
+                    site_of[neighbor] = site
+                    push(open_set, (new_distance << shift) | neighbor)
+
+    def _add_wall(self, index: int):
+        self.wall_site[index] = index
+        self.wall_distance[index] = 0
+        self._propagate_walls([index])
+
+    def _remove_wall(self, index: int):
+        # Cells that took this wall as their nearest are forgotten, then
+        # refilled from the ring of cells around them that still hold a
+        # valid nearest wall.
+        site_of = self.wall_site
+        distance = self.wall_distance
+        offsets = self.neighbor_offsets
+        size = self.size
+        region = {index}
+        frontier = [index]
+        while frontier:
+            current = frontier.pop()
+            for offset, _ in offsets:
+                neighbor = current + offset
+                if 0 <= neighbor < size and neighbor not in region and site_of[neighbor] == index:
+                    region.add(neighbor)
+                    frontier.append(neighbor)
+
+        for cell in region:
+            distance[cell] = FLOW_UNREACHABLE
+        border = set()
+        for cell in region:
+            for offset, _ in offsets:
+                neighbor = cell + offset
+                if 0 <= neighbor < size and neighbor not in region:
+                    border.add(neighbor)
+        self._propagate_walls(list(border))
+
+    def clearance(self, index: int) -> float:
+        self._ensure_wall_distance()
+        return math.sqrt(self.wall_distance[index]) * self.cell_size / 2
+
+    def distance_to_wall(self, pos: Tuple[float, float]) -> float:
+        index = self.world_to_index(pos)
+        if index is None or not self.walkable[index]:
+            return 0.0
+        # Any blocked cell outside the ring around the point's own cell is at
+        # least a cell away, so testing the eight ring cells gives the exact
+        # distance up to one cell and anything farther reads as one cell.
+        # Every body radius is smaller than that. A ring wall puts the cell
+        # within two squared half-cells in the distance transform, so cells
+        # past that skip the test.
+        self._ensure_wall_distance()
+        if self.wall_distance[index] > 2:
+            return float(self.cell_size)
+        walkable = self.walkable
+        cell_x = self.cell_x
+        cell_y = self.cell_y
+        cell_size = self.cell_size
+        best = cell_size * cell_size
+        for offset, _ in self.neighbor_offsets:
+            wall = index + offset
+            if walkable[wall]:
+                continue
+            left = cell_x[wall] * cell_size
+            top = cell_y[wall] * cell_size
+            dx = max(left - pos[0], pos[0] - left - cell_size, 0)
+            dy = max(top - pos[1], pos[1] - top - cell_size, 0)
+            distance = dx * dx + dy * dy
+            if distance < best:
+                best = distance
+        return math.sqrt(best)
+
+    def distances_to_wall(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        walkable: Optional[np.ndarray] = None,
+        base: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        # distance_to_wall() for many points at once. walkable may hold
+        # several grids of this shape end to end, with base giving the
+        # offset of each point's grid.
+        if walkable is None:
+            walkable = np.frombuffer(self.walkable, dtype=np.uint8)
+        cell_size = self.cell_size
+        column = x.astype(np.int64) // cell_size
+        row = y.astype(np.int64) // cell_size
+        inside = (
+            (column >= 0)
+            & (column < self.grid_width)
+            & (row >= 0)
+            & (row < self.grid_height)
+        )
+        index = np.where(inside, (row + 1) * self.stride + column + 1, self.stride + 1)
+        if base is not None:
+            index = index + base
+        corner = self.cell_index(1, 1)
+        ring = np.array([offset for offset, _ in self.neighbor_offsets])
+        ring_x = np.array([self.cell_x[corner + offset] - 1 for offset in ring.tolist()])
+        ring_y = np.array([self.cell_y[corner + offset] - 1 for offset in ring.tolist()])
+        left = (column[:, None] + ring_x) * cell_size
+        top = (row[:, None] + ring_y) * cell_size
+        px = x[:, None]
+        py = y[:, None]
+        dx = np.maximum(np.maximum(left - px, px - left - cell_size), 0)
+        dy = np.maximum(np.maximum(top - py, py - top - cell_size), 0)
+        squared = np.where(walkable[index[:, None] + ring] == 0, dx * dx + dy * dy, cell_size**2)
+        distance = np.sqrt(squared.min(axis=1))
+        distance[~(inside & (walkable[index] != 0))] = 0.0
+        return distance
+
+    def body_radius(self, radius: float) -> float:
+        # Wall collisions use a smaller body than the sprite: a sprite radius
+        # wider than a cell would seal every one-cell gap.
+        return min(radius, self.cell_size * 3 // 8)
+
+    def can_move(
+        self, from_pos: Tuple[float, float], to_pos: Tuple[float, float], radius: float
+    ) -> bool:
+        # A body already overlapping a wall (spawned or pushed there) may
+        # still move as long as it does not dig in deeper.
+        distance = self.distance_to_wall(to_pos)
+        return distance >= radius or distance > self.distance_to_wall(from_pos)
+
+    def clearance_mask(self, radius: float) -> bytearray:
+        if radius <= 0:
+            return self.walkable
+        cached = self._clearance_masks.get(radius)
+        if cached is not None and cached[0] == self.obstacle_version:
+            return cached[1]
+        self._ensure_wall_distance()
+        needed = 4 * radius * radius / (self.cell_size * self.cell_size)
+        walkable = self.walkable
+        distance = self.wall_distance
+        mask = bytearray(
+            1 if walkable[index] and distance[index] >= needed else 0
+            for index in range(self.size)
+        )
+        self._clearance_masks[radius] = (self.obstacle_version, mask)
+        return mask
+
+    def component_of(self, index: int) -> int:
+        label = self.component[index]
+        if label < 0:
+            return -1
+        return self._find_component(label)
+
+    def connected(self, start: int, goal: int) -> bool:
+        start_label = self.component_of(start)
+        return start_label >= 0 and start_label == self.component_of(goal)
+
+    def _merge_component(self, index: int):
+        walkable = self.walkable
+        root = -1
+        for offset, _ in self.neighbor_offsets:
+            neighbor = index + offset
+            if not walkable[neighbor]:
+                continue
+            other = self.component_of(neighbor)
+            if root < 0:
+                root = other
+            elif other != root:
+                self._component_parent[other] = root
+        if root < 0:
+            root = self._new_component()
+        self.component[index] = root
+
+    def _split_component(self, index: int):
+        walkable = self.walkable
+        offsets = self.neighbor_offsets
+        self.component[index] = -1
+        seeds = [index + offset for offset, _ in offsets if walkable[index + offset]]
+        if len(seeds) < 2:
+            return
+
+        # Flood from every former neighbour in lockstep. Floods that touch
+        # join up; a flood that runs dry before the others has found a piece
+        # that was cut off. Once a single flood is left it keeps the old
+        # label, so only the cut-off pieces are ever walked in full.
+        owner: Dict[int, int] = {}
+        group = list(range(len(seeds)))
+        frontiers = []
+        members = []
+        for seed_group, seed in enumerate(seeds):
+            owner[seed] = seed_group
+            frontiers.append(deque([seed]))
+            members.append([seed])
+
+        def find(seed_group: int) -> int:
+            while group[seed_group] != seed_group:
+                seed_group = group[seed_group]
+            return seed_group
+
+        active = list(range(len(seeds)))
+        isolated = []
+        while len(active) > 1:
+            for seed_group in active[:]:
+                if group[seed_group] != seed_group:
+                    continue
+                frontier = frontiers[seed_group]
+                if not frontier:
+                    active.remove(seed_group)
+                    isolated.append(seed_group)
+                    continue
+                current = frontier.popleft()
+                for offset, _ in offsets:
+                    neighbor = current + offset
+                    if not walkable[neighbor]:
+                        continue
+                    other = owner.get(neighbor)
+                    if other is None:
+                        owner[neighbor] = seed_group
+                        members[seed_group].append(neighbor)
+                        frontier.append(neighbor)
+                        continue
+                    other = find(other)
+                    if other != seed_group:
+                        group[other] = seed_group
+                        frontier.extend(frontiers[other])
+                        members[seed_group].extend(members[other])
+                        frontiers[other].clear()
+                        members[other] = []
+                        active.remove(other)
+            active = [seed_group for seed_group in active if group[seed_group] == seed_group]
+
+        component = self.component
+        for seed_group in isolated:
+            label = self._new_component()
+            for cell in members[seed_group]:
+                component[cell] = label
+            self.component_relabels += 1
+
+    def add_obstacle_listener(self, listener: Callable[[int], None]):
+        self.obstacle_listeners.append(listener)
+
+    def remove_obstacle_listener(self, listener: Callable[[int], None]):
+        if listener in self.obstacle_listeners:
+            self.obstacle_listeners.remove(listener)
 
     def is_walkable(self, grid_x: int, grid_y: int) -> bool:
         if grid_x < 0 or grid_x >= self.grid_width:
             return False
         if grid_y < 0 or grid_y >= self.grid_height:
             return False
-        return (grid_x, grid_y) not in self.obstacles
+        return self.walkable[self.cell_index(grid_x, grid_y)] == 1
 
-    def heuristic(self, node: Node, goal: Node) -> float:
-        dx = abs(node.x - goal.x)
-        dy = abs(node.y - goal.y)
+    def heuristic(self, index: int, goal: int) -> int:
+        if self.landmarks is not None:
+            return self.landmarks.estimate(index, goal)
+        dx = abs(self.cell_x[index] - self.cell_x[goal])
+        dy = abs(self.cell_y[index] - self.cell_y[goal])
         return (dx + dy) * 10
 
-    def get_neighbors(self, node: Node) -> List[Node]:
-        neighbors = []
-        directions = [
-            (0, 1),
-            (1, 0),
-            (0, -1),
-            (-1, 0),
-            (1, 1),
-            (1, -1),
-            (-1, 1),
-            (-1, -1),
-        ]
-
-        for dx, dy in directions:
-            new_x = node.x + dx
-            new_y = node.y + dy
+    def search(self, start: int, goal: int, radius: float = 0) -> List[int]:
+        if not self.telemetry_enabled:
+            return self._search(start, goal, radius)
+        started = time.perf_counter()
+        path = self._search(start, goal, radius)
+        self.telemetry.record(
+            self.last_expanded,
+            self.last_pushed,
+            self.last_heap_peak,
+            len(path),
+            time.perf_counter() - started,
+        )
+        return path
 
-            if self.is_walkable(new_x, new_y):
-                cost = 14 if abs(dx) + abs(dy) == 2 else 10
-                neighbors.append(Node(new_x, new_y))
+    def _search(self, start: int, goal: int, radius: float = 0) -> List[int]:
+        if self.walkable[start] and not self.connected(start, goal):
+            self._finish_search(0, 0, 0)
+            return []
+        # Jump scans assume bare cells, so radius searches always run A*.
+        if self.algorithm == "jps" and radius <= 0:
+            return self.jump_point_search(start, goal)
+        return self.astar_search(start, goal, radius)
 
-        return neighbors
+    def _finish_search(self, expanded: int, pushed: int, heap_peak: int):
+        self.last_expanded = expanded
+        self.last_pushed = pushed
+        self.last_heap_peak = heap_peak
 
-    def find_path(
-        self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int]
-    ) -> List[Tuple[int, int]]:
-        start_grid_x = start_pos[0] // self.cell_size
-        start_grid_y = start_pos[1] // self.cell_size
-        goal_grid_x = goal_pos[0] // self.cell_size
-        goal_grid_y = goal_pos[1] // self.cell_size
+    def _claim_stamps(self) -> int:
+        # Each search claims two fresh stamps (open, closed). Once the
+        # counter reaches STAMP_LIMIT the state buffer is zeroed and
+        # numbering starts over, so stamps stay machine-sized ints.
+        if self._generation >= STAMP_LIMIT:
+            self._state = [0] * self.size
+            self._generation = 0
+        self._generation += 2
+        return self._generation
 
-        start = Node(start_grid_x, start_grid_y)
-        goal = Node(goal_grid_x, goal_grid_y)
+    def astar_search(self, start: int, goal: int, radius: float = 0) -> List[int]:
+        # A body with a radius walks its clearance mask and cannot squeeze
+        # diagonally past a corner, so those searches need both cells beside
+        # a diagonal move to be open. The goal itself may lack clearance.
+        walkable = self.clearance_mask(radius)
+        corners = radius > 0
+        diagonal_sides = self.diagonal_sides
+        g_cost = self._g
+        parent = self._parent
+        cell_x = self.cell_x
+        cell_y = self.cell_y
+        offsets = self.neighbor_offsets
+        shift = self._index_bits
+        mask = self._index_mask
+        goal_x = cell_x[goal]
+        goal_y = cell_y[goal]
+        push = heapq.heappush
+        pop = heapq.heappop
+        bounds = None
+        if self.landmarks is not None:
+            if self.landmarks.separated(start, goal):
+                self._finish_search(0, 0, 0)
+                return []
+            bounds = self.landmarks.goal_distances(goal, start)
 
-        if not self.is_walkable(goal.x, goal.y):
-            return []
+        opened = self._claim_stamps()
+        closed = opened + 1
+        state = self._state
 
-        if start == goal:
-            return [goal_pos]
+        # The Manhattan heuristic splits into a column and a row term, so
+        # per query it is two small tables instead of abs() per push.
+        column = self._column
+        row = self._row
+        goal_column = column[goal]
+        goal_row = row[goal]
+        column_h = [abs(x - goal_column) * 10 for x in range(self.stride)]
+        row_h = [abs(y - goal_row) * 10 for y in range(self.size // self.stride)]
 
-        open_set = []
-        heapq.heappush(open_set, start)
-        closed_set: Set[Tuple[int, int]] = set()
-        all_nodes = {start: start}
+        state[start] = opened
+        g_cost[start] = 0
+        parent[start] = -1
+        open_set = [(self.heuristic(start, goal) << shift) | start]
+        expanded = 0
+        pushed = 1
+        peak = 1
 
         while open_set:
-            current = heapq.heappop(open_set)
-
-            if (current.x, current.y) in closed_set:
+            if len(open_set) > peak:
+                peak = len(open_set)
+            current = pop(open_set) & mask
+            if state[current] == closed:
                 continue
-
-            closed_set.add((current.x, current.y))
+            state[current] = closed
+            expanded += 1
 
             if current == goal:
+                self._finish_search(expanded, pushed, peak)
                 path = []
-                node = current
-                while node:
-                    world_x = node.x * self.cell_size + self.cell_size // 2
-                    world_y = node.y * self.cell_size + self.cell_size // 2
-                    path.append((world_x, world_y))
-                    node = node.parent
+                while current != -1:
+                    path.append(current)
+                    current = parent[current]
                 return path[::-1]
 
-            neighbors = self.get_neighbors(current)
-            for neighbor in neighbors:
-                if (neighbor.x, neighbor.y) in closed_set:
+            current_g = g_cost[current]
+            for offset, cost in offsets:
+                neighbor = current + offset
+                if not walkable[neighbor] and (not corners or neighbor != goal):
+                    continue
+                if corners and cost == 14:
+                    side_x, side_y = diagonal_sides[offset]
+                    if not walkable[current + side_x] or not walkable[current + side_y]:
+                        continue
+                neighbor_state = state[neighbor]
+                if neighbor_state == closed:
                     continue
+                tentative_g = current_g + cost
+                if neighbor_state != opened or tentative_g < g_cost[neighbor]:
+                    state[neighbor] = opened
+                    g_cost[neighbor] = tentative_g
+                    parent[neighbor] = current
+                    pushed += 1
+                    if bounds is None:
+                        h = column_h[column[neighbor]] + row_h[row[neighbor]]
+                        push(open_set, ((tentative_g + h) << shift) | neighbor)
+                        continue
 
-                if neighbor not in all_nodes:
-                    all_nodes[neighbor] = neighbor
+                    # Octile distance, raised by the triangle inequality
+                    # |d(L, n) - d(L, goal)| for each landmark L. Ties on f
+                    # go to the smaller h, which the admissible bound
+                    # otherwise leaves as wide plateaus.
+                    dx = abs(cell_x[neighbor] - goal_x)
+                    dy = abs(cell_y[neighbor] - goal_y)
+                    h = 10 * dx + 4 * dy if dx > dy else 10 * dy + 4 * dx
+                    for table, goal_distance in bounds:
+                        bound = table[neighbor] - goal_distance
+                        if bound < 0:
+                            bound = -bound
+                        if bound > h:
+                            h = bound
+                    push(open_set, ((((tentative_g + h) << TIE_BITS) | h) << shift) | neighbor)
+
+        self._finish_search(expanded, pushed, peak)
+        return []
 
-                neighbor_node = all_nodes[neighbor]
-                tentative_g = current.g + (
-                    14
-                    if abs(neighbor.x - current.x) + abs(neighbor.y - current.y) == 2
-                    else 10
-                )
+    def jump_point_search(self, start: int, goal: int) -> List[int]:
+        g_cost = self._g
+        parent = self._parent
+        cell_x = self.cell_x
+        cell_y = self.cell_y
+        shift = self._index_bits
+        mask = self._index_mask
+        goal_x = cell_x[goal]
+        goal_y = cell_y[goal]
+        push = heapq.heappush
+        pop = heapq.heappop
+        jump = self._jump
 
-                if neighbor_node.g == 0 or tentative_g < neighbor_node.g:
-                    neighbor_node.g = tentative_g
-                    neighbor_node.h = self.heuristic(neighbor_node, goal)
-                    neighbor_node.parent = current
-                    heapq.heappush(open_set, neighbor_node)
+        opened = self._claim_stamps()
+        closed = opened + 1
+        state = self._state
 
+        state[start] = opened
+        g_cost[start] = 0
+        parent[start] = -1
+        open_set = [(self.heuristic(start, goal) << shift) | start]
+        expanded = 0
+        pushed = 1
+        peak = 1
+
+        while open_set:
+            if len(open_set) > peak:
+                peak = len(open_set)
+            current = pop(open_set) & mask
+            if state[current] == closed:
+                continue
+            state[current] = closed
+            expanded += 1
+
+            if current == goal:
+                self._finish_search(expanded, pushed, peak)
+                return self._expand_jump_path(current)
+
+            current_g = g_cost[current]
+            x = cell_x[current]
+            y = cell_y[current]
+            for dx, dy in self._jump_directions(current, parent[current]):
+                jump_point = jump(current, dx, dy, goal)
+                if jump_point < 0 or state[jump_point] == closed:
+                    continue
+                dist_x = abs(cell_x[jump_point] - x)
+                dist_y = abs(cell_y[jump_point] - y)
+                tentative_g = current_g + 10 * max(dist_x, dist_y) + 4 * min(dist_x, dist_y)
+                if state[jump_point] != opened or tentative_g < g_cost[jump_point]:
+                    state[jump_point] = opened
+                    g_cost[jump_point] = tentative_g
+                    parent[jump_point] = current
+                    h = (abs(cell_x[jump_point] - goal_x) + abs(cell_y[jump_point] - goal_y)) * 10
+                    pushed += 1
+                    push(open_set, ((tentative_g + h) << shift) | jump_point)
+
+        self._finish_search(expanded, pushed, peak)
         return []
 
+    def _jump_directions(self, index: int, parent: int) -> List[Tuple[int, int]]:
+        if parent < 0:
+            return [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+        walkable = self.walkable
+        stride = self.stride
+        dx = (self.cell_x[index] > self.cell_x[parent]) - (self.cell_x[index] < self.cell_x[parent])
+        dy = (self.cell_y[index] > self.cell_y[parent]) - (self.cell_y[index] < self.cell_y[parent])
+        row = dy * stride
+
+        if dx and dy:
+            directions = [(dx, 0), (0, dy), (dx, dy)]
+            if not walkable[index - dx] and walkable[index - dx + row]:
+                directions.append((-dx, dy))
+            if not walkable[index - row] and walkable[index + dx - row]:
+                directions.append((dx, -dy))
+        elif dx:
+            directions = [(dx, 0)]
+            if not walkable[index + stride] and walkable[index + dx + stride]:
+                directions.append((dx, 1))
+            if not walkable[index - stride] and walkable[index + dx - stride]:
+                directions.append((dx, -1))
+        else:
+            directions = [(0, dy)]
+            if not walkable[index + 1] and walkable[index + 1 + row]:
+                directions.append((1, dy))
+            if not walkable[index - 1] and walkable[index - 1 + row]:
+                directions.append((-1, dy))
+        return directions
+
+    def _jump(self, index: int, dx: int, dy: int, goal: int) -> int:
+        walkable = self.walkable
+        stride = self.stride
+        row = dy * stride
+        step = dx + row
+
+        while True:
+            index += step
+            if not walkable[index]:
+                return -1
+            if index == goal:
+                return index
+            if dx and dy:
+                if not walkable[index - dx] and walkable[index - dx + row]:
+                    return index
+                if not walkable[index - row] and walkable[index + dx - row]:
+                    return index
+                if self._jump(index, dx, 0, goal) >= 0 or self._jump(index, 0, dy, goal) >= 0:
+                    return index
+            elif dx:
+                if not walkable[index + stride] and walkable[index + dx + stride]:
+                    return index
+                if not walkable[index - stride] and walkable[index + dx - stride]:
+                    return index
+            else:
+                if not walkable[index + 1] and walkable[index + 1 + row]:
+                    return index
+                if not walkable[index - 1] and walkable[index - 1 + row]:
+                    return index
+
+    def _expand_jump_path(self, index: int) -> List[int]:
+        parent = self._parent
+        cell_x = self.cell_x
+        cell_y = self.cell_y
+        path = [index]
+        while parent[index] != -1:
+            previous = parent[index]
+            dx = (cell_x[previous] > cell_x[index]) - (cell_x[previous] < cell_x[index])
+            dy = (cell_y[previous] > cell_y[index]) - (cell_y[previous] < cell_y[index])
+            step = dx + dy * self.stride
+            while index != previous:
+                index += step
+                path.append(index)
+        return path[::-1]
+
+    def cached_search(self, start: int, goal: int, radius: float = 0) -> Tuple[List[int], int]:
+        cached = self.cache_lookup(start, goal, radius)
+        if cached is not None:
+            return cached
+
+        path = self.search(start, goal, radius)
+        self.cache_path(start, goal, path, radius)
+        return path, 0
+
+    def cache_lookup(
+        self, start: int, goal: int, radius: float = 0
+    ) -> Optional[Tuple[List[int], int]]:
+        if self._cache_version != self.obstacle_version:
+            self.clear_path_cache()
+
+        entry = self._cache_index.get((start, goal, radius))
+        if entry is None:
+            self.cache_misses += 1
+            return None
+        key, position = entry
+        self.path_cache.move_to_end(key)
+        self.cache_hits += 1
+        return self.path_cache[key], position
+
+    def cache_path(self, start: int, goal: int, path: List[int], radius: float = 0):
+        if self._cache_version != self.obstacle_version:
+            self.clear_path_cache()
+        if self.cache_size > 0:
+            self._store_path(start, goal, path, radius)
+
+    def _store_path(self, start: int, goal: int, path: List[int], radius: float = 0):
+        key = (start, goal, radius)
+        previous = self.path_cache.get(key)
+        if previous is not None:
+            self._unindex_path(key, previous)
+            self.path_cache.move_to_end(key)
+        self.path_cache[key] = path
+        self._cache_index[key] = (key, 0)
+        for position in range(1, len(path) - 1):
+            self._cache_index[(path[position], goal, radius)] = (key, position)
+
+        while len(self.path_cache) > self.cache_size:
+            old_key, old_path = self.path_cache.popitem(last=False)
+            self._unindex_path(old_key, old_path)
+            self.cache_evictions += 1
+
+    def _unindex_path(self, key: Tuple[int, int, float], path: List[int]):
+        # Suffix entries another cached path has since claimed stay put.
+        start, goal, radius = key
+        for cell in [start] + path[1:-1]:
+            entry = self._cache_index.get((cell, goal, radius))
+            if entry is not None and entry[0] == key:
+                del self._cache_index[(cell, goal, radius)]
+
+    def clear_path_cache(self):
+        self.path_cache.clear()
+        self._cache_index.clear()
+        self._cache_version = self.obstacle_version
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "evictions": self.cache_evictions,
+            "size": len(self.path_cache),
+            "capacity": self.cache_size,
+        }
+
+    def update_flow_field(self, goal_pos: Tuple[int, int], radius: Optional[float] = None) -> bool:
+        # With no radius, every field a get_flow_step caller has asked for is
+        # brought up to date, so they can be built once per tick up front.
+        goal = self.world_to_index(goal_pos)
+        radii = list(self.flow_fields) if radius is None else [radius]
+        rebuilt = False
+        for body_radius in radii:
+            entry = self.flow_fields.get(body_radius)
+            if entry is not None and entry[0] == goal and entry[1] == self.obstacle_version:
+                continue
+            if goal is None or not self.walkable[goal]:
+                field = [FLOW_UNREACHABLE] * self.size
+            else:
+                field = self.distance_field(goal, body_radius)
+            self.flow_fields[body_radius] = (goal, self.obstacle_version, field)
+            self.flow_field_builds += 1
+            rebuilt = True
+        return rebuilt
+
+    def update_field_of_view(self, origin_pos: Tuple[float, float], radius: float) -> bool:
+        # Rebuilt only when the origin changes cell, the obstacles change or
+        # a wider radius is asked for; a wider bitmap than needed is still
+        # exact for every cell it covers. Both ends sit anywhere in their
+        # cells, so the radius in cells carries a cell diagonal of slack.
+        origin = self.world_to_index(origin_pos)
+        cells = math.ceil(radius / self.cell_size + 1.5)
+        if (
+            origin == self._view_origin
+            and self._view_version == self.obstacle_version
+            and cells <= self._view_radius
+        ):
+            return False
+
+        self._view_origin = origin
+        self._view_version = self.obstacle_version
+        self._view_radius = cells
+        self.field_of_view_builds += 1
+        if origin is None:
+            self.visible = bytearray(self.size)
+        else:
+            self.visible = self.shadowcast(origin, cells)
+        return True
+
+    def is_visible(self, pos: Tuple[float, float]) -> bool:
+        index = self.world_to_index(pos)
+        return index is not None and self.visible[index] == 1
+
+    def shadowcast(self, origin: int, radius: int) -> bytearray:
+        visible = bytearray(self.size)
+        visible[origin] = 1
+        origin_x = origin % self.stride
+        origin_y = origin // self.stride
+        for octant in FOV_OCTANTS:
+            self._cast_light(visible, origin_x, origin_y, 1, 1.0, 0.0, radius, octant)
+        return visible
+
+    def _cast_light(
+        self,
+        visible: bytearray,
+        origin_x: int,
+        origin_y: int,
+        row: int,
+        start: float,
+        end: float,
+        radius: int,
+        octant: Tuple[int, int, int, int],
+    ):
+        # Recursive shadowcasting over one octant: rows are scanned outward
+        # between two slopes, and each run of walls narrows the lit range,
+        # with the part before the run carried on by a recursive call.
+        if start < end:
+            return
+        xx, xy, yx, yy = octant
+        walkable = self.walkable
+        stride = self.stride
+        rows = self.size // stride
+        radius_sq = radius * radius
+        new_start = start
+        for distance in range(row, radius + 1):
+            dy = -distance
+            blocked = False
+            for dx in range(-distance, 1):
+                left_slope = (dx - 0.5) / (dy + 0.5)
+                right_slope = (dx + 0.5) / (dy - 0.5)
+                if start < right_slope:
+                    continue
+                if end > left_slope:
+                    break
+                x = origin_x + dx * xx + dy * xy
+                y = origin_y + dx * yx + dy * yy
+                inside = 0 <= x < stride and 0 <= y < rows
+                index = y * stride + x
+                if inside and dx * dx + dy * dy <= radius_sq:
+                    visible[index] = 1
+                wall = not inside or not walkable[index]
+                if blocked:
+                    if wall:
+                        new_start = right_slope
+                        continue
+                    blocked = False
+                    start = new_start
+                elif wall and distance < radius:
+                    blocked = True
+                    self._cast_light(
+                        visible, origin_x, origin_y, distance + 1, start, left_slope, radius, octant
+                    )
+                    new_start = right_slope
+            if blocked:
+                break
+
+    def distance_field(self, source: int, radius: float = 0) -> List[int]:
+        # Same moves as PathSearch for a body of this radius: cells need the
+        # clearance, diagonals need both cells beside them open, and the
+        # source is seeded even when it is not clear itself.
+        walkable = self.clearance_mask(radius)
+        offsets = self.neighbor_offsets
+        diagonal_sides = self.diagonal_sides
+        corners = radius > 0
+        shift = self._index_bits
+        mask = self._index_mask
+        push = heapq.heappush
+        pop = heapq.heappop
+
+        field = [FLOW_UNREACHABLE] * self.size
+        field[source] = 0
+        open_set = [source]
+        while open_set:
+            key = pop(open_set)
+            current = key & mask
+            current_cost = key >> shift
+            if current_cost > field[current]:
+                continue
+            for offset, cost in offsets:
+                neighbor = current + offset
+                if not walkable[neighbor]:
+                    continue
+                if corners and cost == 14:
+                    side_x, side_y = diagonal_sides[offset]
+                    if not walkable[current + side_x] or not walkable[current + side_y]:
+                        continue
+                new_cost = current_cost + cost
+                if new_cost < field[neighbor]:
+                    field[neighbor] = new_cost
+                    push(open_set, (new_cost << shift) | neighbor)
+        return field
+
+    def get_flow_step(
+        self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int], radius: float = 0
+    ) -> Optional[Tuple[int, int]]:
+        self.update_flow_field(goal_pos, radius)
+        goal, _, field = self.flow_fields[radius]
+        start = self.world_to_index(start_pos)
+        if start is None or goal is None or field[goal] != 0:
+            return None
+        if start == goal:
+            return goal_pos
+
+        walkable = self.clearance_mask(radius)
+        diagonal_sides = self.diagonal_sides
+        corners = radius > 0
+        best = start
+        best_cost = field[start]
+        for offset, cost in self.neighbor_offsets:
+            neighbor = start + offset
+            if field[neighbor] >= best_cost:
+                continue
+            if corners and cost == 14:
+                side_x, side_y = diagonal_sides[offset]
+                if not walkable[start + side_x] or not walkable[start + side_y]:
+                    continue
+            best = neighbor
+            best_cost = field[neighbor]
+        if best == start:
+            return None
+        return self.index_to_world(best)
+
+    def resolve_endpoints(
+        self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int]
+    ) -> Optional[Tuple[int, int]]:
+        goal = self.world_to_index(goal_pos)
+        if goal is None or not self.walkable[goal]:
+            return None
+        start = self.world_to_index(start_pos)
+        if start is None:
+            return None
+        return start, goal
+
+    def line_of_sight(
+        self,
+        start_pos: Tuple[float, float],
+        goal_pos: Tuple[float, float],
+        radius: float = 0,
+    ) -> bool:
+        walkable = self.clearance_mask(radius)
+        if not self._raycast(walkable, start_pos, goal_pos):
+            return False
+        if radius <= 0:
+            return True
+
+        # A body of the given radius sweeps a band: also cast the two edges.
+        dx = goal_pos[0] - start_pos[0]
+        dy = goal_pos[1] - start_pos[1]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            return True
+        side_x = -dy / length * radius
+        side_y = dx / length * radius
+        for sign in (1, -1):
+            edge_start = (start_pos[0] + sign * side_x, start_pos[1] + sign * side_y)
+            edge_goal = (goal_pos[0] + sign * side_x, goal_pos[1] + sign * side_y)
+            if not self._raycast(walkable, edge_start, edge_goal):
+                return False
+        return True
+
+    def _raycast(
+        self,
+        walkable: bytearray,
+        start_pos: Tuple[float, float],
+        goal_pos: Tuple[float, float],
+    ) -> bool:
+        # Supercover traversal (Amanatides & Woo) of every cell the segment
+        # touches. A segment passing exactly through a grid corner must have
+        # both cells beside that corner free, so the result never cuts a
+        # corner that movement could not.
+        start = self.world_to_index(start_pos)
+        goal = self.world_to_index(goal_pos)
+        if start is None or goal is None:
+            return False
+        if not walkable[start] or not walkable[goal]:
+            return False
+        if start == goal:
+            return True
+
+        x0 = start_pos[0] / self.cell_size
+        y0 = start_pos[1] / self.cell_size
+        dx = goal_pos[0] / self.cell_size - x0
+        dy = goal_pos[1] / self.cell_size - y0
+        step_x = 1 if dx > 0 else -1
+        step_y = self.stride if dy > 0 else -self.stride
+        inf = float("inf")
+        delta_x = abs(1 / dx) if dx else inf
+        delta_y = abs(1 / dy) if dy else inf
+        if dx > 0:
+            t_x = (int(x0) + 1 - x0) * delta_x
+        else:
+            t_x = (x0 - int(x0)) * delta_x if dx else inf
+        if dy > 0:
+            t_y = (int(y0) + 1 - y0) * delta_y
+        else:
+            t_y = (y0 - int(y0)) * delta_y if dy else inf
+
+        index = start
+        remaining = abs(self.cell_x[goal] - self.cell_x[start]) + abs(
+            self.cell_y[goal] - self.cell_y[start]
+        )
+        while remaining > 0:
+            if t_x < t_y:
+                index += step_x
+                t_x += delta_x
+                remaining -= 1
+            elif t_y < t_x:
+                index += step_y
+                t_y += delta_y
+                remaining -= 1
+            else:
+                if not walkable[index + step_x] or not walkable[index + step_y]:
+                    return False
+                index += step_x + step_y
+                t_x += delta_x
+                t_y += delta_y
+                remaining -= 2
+            if not walkable[index]:
+                return False
+        return True
+
+    def smooth_path(self, path: List[int], radius: float = 0) -> List[int]:
+        if len(path) < 3:
+            return list(path)
+        to_world = self.index_to_world
+        smoothed = [path[0]]
+        anchor = to_world(path[0])
+        for position in range(2, len(path)):
+            if not self.line_of_sight(anchor, to_world(path[position]), radius):
+                smoothed.append(path[position - 1])
+                anchor = to_world(path[position - 1])
+        smoothed.append(path[-1])
+        return smoothed
+
+    def direct_path(self, start: int, goal: int, radius: float = 0) -> Optional[List[int]]:
+        if self.line_of_sight(self.index_to_world(start), self.index_to_world(goal), radius):
+            return [start, goal]
+        return None
+
+    def begin_search(self, start: int, goal: int, radius: float = 0) -> "PathSearch":
+        return PathSearch(self, start, goal, radius)
+
+    def find_path(
+        self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int], radius: float = 0
+    ) -> List[Tuple[int, int]]:
+        endpoints = self.resolve_endpoints(start_pos, goal_pos)
+        if endpoints is None:
+            return []
+        start, goal = endpoints
+        if start == goal:
+            return [goal_pos]
+
+        path = self.direct_path(start, goal, radius)
+        if path is None:
+            cached, position = self.cached_search(start, goal, radius)
+            path = self.smooth_path(cached[position:], radius)
+        return [self.index_to_world(index) for index in path]
+
     def get_next_step(
         self, start_pos: Tuple[int, int], goal_pos: Tuple[int, int]
     ) -> Optional[Tuple[int, int]]:
-        path = self.find_path(start_pos, goal_pos)
-        if len(path) > 1:
-            return path[1]
-        elif len(path) == 1:
-            return path[0]
+        endpoints = self.resolve_endpoints(start_pos, goal_pos)
+        if endpoints is None:
+            return None
+        start, goal = endpoints
+        if start == goal:
+            return goal_pos
+
+        path, position = self.cached_search(start, goal)
+        if position + 1 < len(path):
+            return self.index_to_world(path[position + 1])
         return None
+
+
+class PathSearch:
+    def __init__(self, pathfinding: Pathfinding, start: int, goal: int, radius: float = 0):
+        self.pathfinding = pathfinding
+        self.start = start
+        self.goal = goal
+        self.radius = radius
+        self.status = SEARCH_IN_PROGRESS
+        self.path: List[int] = []
+        self.last_expanded = 0
+        self.expanded = 0
+        self.pushed = 0
+        self.heap_peak = 0
+        self.seconds = 0.0
+        self.restart()
+
+    def restart(self):
+        pathfinding = self.pathfinding
+        self.version = pathfinding.obstacle_version
+        self.g: Dict[int, int] = {self.start: 0}
+        self.parent: Dict[int, int] = {self.start: -1}
+        self.closed: Set[int] = set()
+        self.open_set = [
+            (pathfinding.heuristic(self.start, self.goal) << pathfinding._index_bits)
+            | self.start
+        ]
+        self.pushed += 1
+        if pathfinding.walkable[self.start] and not pathfinding.connected(self.start, self.goal):
+            self.open_set.clear()
+
+    def step(self, budget: int) -> str:
+        if self.status != SEARCH_IN_PROGRESS:
+            return self.status
+
+        # The grid is free to change between slices; a search started on an
+        # older layout would hand back a stale path, so it starts over.
+        pathfinding = self.pathfinding
+        if pathfinding.obstacle_version != self.version:
+            self.restart()
+        if pathfinding.telemetry_enabled:
+            started = time.perf_counter()
+
+        walkable = pathfinding.clearance_mask(self.radius)
+        offsets = pathfinding.neighbor_offsets
+        diagonal_sides = pathfinding.diagonal_sides
+        # A body with a radius cannot squeeze diagonally past a corner, so
+        # those searches need both cells beside a diagonal move to be open.
+        corners = self.radius > 0
+        heuristic = pathfinding.heuristic
+        shift = pathfinding._index_bits
+        mask = pathfinding._index_mask
+        goal = self.goal
+        g_cost = self.g
+        parent = self.parent
+        closed = self.closed
+        open_set = self.open_set
+        push = heapq.heappush
+        pop = heapq.heappop
+
+        expanded = 0
+        pushed = 0
+        peak = self.heap_peak
+        while open_set and expanded < budget:
+            if len(open_set) > peak:
+                peak = len(open_set)
+            current = pop(open_set) & mask
+            if current in closed:
+                continue
+            closed.add(current)
+            expanded += 1
+
+            if current == goal:
+                path = []
+                while current != -1:
+                    path.append(current)
+                    current = parent[current]
+                self.path = path[::-1]
+                self.status = SEARCH_FOUND
+                break
+
+            current_g = g_cost[current]
+            for offset, cost in offsets:
+                neighbor = current + offset
+                if neighbor in closed or not (walkable[neighbor] or neighbor == goal):
+                    continue
+                if corners and cost == 14:
+                    side_x, side_y = diagonal_sides[offset]
+                    if not walkable[current + side_x] or not walkable[current + side_y]:
+                        continue
+                tentative_g = current_g + cost
+                if tentative_g < g_cost.get(neighbor, FLOW_UNREACHABLE):
+                    g_cost[neighbor] = tentative_g
+                    parent[neighbor] = current
+                    pushed += 1
+                    push(open_set, ((tentative_g + heuristic(neighbor, goal)) << shift) | neighbor)
+
+        if self.status == SEARCH_IN_PROGRESS and not open_set:
+            self.status = SEARCH_FAILED
+        self.last_expanded = expanded
+        self.expanded += expanded
+        self.pushed += pushed
+        self.heap_peak = peak
+        if pathfinding.telemetry_enabled:
+            self.seconds += time.perf_counter() - started
+        if self.status == SEARCH_IN_PROGRESS:
+            return self.status
+
+        pathfinding.cache_path(self.start, self.goal, self.path, self.radius)
+        if pathfinding.telemetry_enabled:
+            pathfinding.telemetry.record(
+                self.expanded, self.pushed, self.heap_peak, len(self.path), self.seconds
+            )
+        return self.status
@@ -0,0 +1,211 @@
+import struct
+import time
+import zlib
+from array import array
+from typing import List, Optional, Sequence
+
+from simulation import InputCommand, Simulation
+
+FILE_MAGIC = b"NPR2"
+HEADER = struct.Struct("<4sqHHHHHHBII")
+# Version 1 files predate sharded NPCs and replay in-process.
+V1_MAGIC = b"NPR1"
+V1_HEADER = struct.Struct("<4sqHHHHHBII")
+
+MOVE_UP = 1
+MOVE_DOWN = 2
+MOVE_LEFT = 4
+MOVE_RIGHT = 8
+RESET = 16
+
+
+def encode_command(command: InputCommand) -> int:
+    mask = 0
+    if command.move_y < 0:
+        mask |= MOVE_UP
+    elif command.move_y > 0:
+        mask |= MOVE_DOWN
+    if command.move_x < 0:
+        mask |= MOVE_LEFT
+    elif command.move_x > 0:
+        mask |= MOVE_RIGHT
+    return mask
+
+
+def decode_command(mask: int) -> InputCommand:
+    return InputCommand(
+        bool(mask & MOVE_RIGHT) - bool(mask & MOVE_LEFT),
+        bool(mask & MOVE_DOWN) - bool(mask & MOVE_UP),
+    )
+
+
+class InputRecording:
+    def __init__(
+        self,
+        seed: int,
+        tick_rate: int = 60,
+        width: int = 1200,
+        height: int = 800,
+        cell_size: int = 40,
+        player_radius: int = 25,
+        npc_radii: Sequence[int] = (),
+        masks: Optional[bytearray] = None,
+        npc_workers: int = 0,
+    ):
+        # Collision radii come from sprite sizes in the windowed game, so
+        # they are stored alongside the seed for a display-free replay. A
+        # sharded session is only reproducible with the same worker count.
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.player_radius = player_radius
+        self.npc_radii = list(npc_radii)
+        self.masks = masks if masks is not None else bytearray()
+        self.npc_workers = npc_workers
+        self._pending_reset = False
+
+    @classmethod
+    def for_simulation(cls, simulation: Simulation) -> "InputRecording":
+        return cls(
+            simulation.seed,
+            simulation.tick_rate,
+            simulation.width,
+            simulation.height,
+            simulation.cell_size,
+            simulation.player_radius,
+            [int(npc.radius) for npc in simulation.npcs],
+            npc_workers=simulation.shards.workers if simulation.shards is not None else 0,
+        )
+
+    def __len__(self):
+        return len(self.masks)
+
+    def record(self, command: InputCommand):
+        mask = encode_command(command)
+        if self._pending_reset:
+            mask |= RESET
+            self._pending_reset = False
+        self.masks.append(mask)
+
+    def mark_reset(self):
+        # The simulation was reset between two ticks; the flag rides on the
+        # next recorded tick so replay resets at the same point.
+        if self.masks:
+            self._pending_reset = True
+
+    def save(self, path: str):
+        payload = zlib.compress(bytes(self.masks), 9)
+        with open(path, "wb") as handle:
+            handle.write(
+                HEADER.pack(
+                    FILE_MAGIC,
+                    self.seed,
+                    self.tick_rate,
+                    self.width,
+                    self.height,
+                    self.cell_size,
+                    self.player_radius,
+                    self.npc_workers,
+                    len(self.npc_radii),
+                    len(self.masks),
+                    zlib.crc32(payload),
+                )
+            )
+            array("H", self.npc_radii).tofile(handle)
+            handle.write(payload)
+
+    @classmethod
+    def load(cls, path: str) -> "InputRecording":
+        with open(path, "rb") as handle:
+            magic = handle.read(len(FILE_MAGIC))
+            handle.seek(0)
+            if magic == FILE_MAGIC:
+                (
+                    magic,
+                    seed,
+                    tick_rate,
+                    width,
+                    height,
+                    cell_size,
+                    player_radius,
+                    npc_workers,
+                    npc_count,
+                    ticks,
+                    checksum,
+                ) = HEADER.unpack(handle.read(HEADER.size))
+            elif magic == V1_MAGIC:
+                npc_workers = 0
+                (
+                    magic,
+                    seed,
+                    tick_rate,
+                    width,
+                    height,
+                    cell_size,
+                    player_radius,
+                    npc_count,
+                    ticks,
+                    checksum,
+                ) = V1_HEADER.unpack(handle.read(V1_HEADER.size))
+            else:
+                raise ValueError(f"{path} is not an input recording")
+            npc_radii = array("H")
+            npc_radii.fromfile(handle, npc_count)
+            payload = handle.read()
+        if zlib.crc32(payload) != checksum:
+            raise ValueError(f"{path} is corrupted")
+        masks = bytearray(zlib.decompress(payload))
+        if len(masks) != ticks:
+            raise ValueError(f"{path} holds {len(masks)} ticks, header says {ticks}")
+        return cls(
+            seed, tick_rate, width, height, cell_size, player_radius, npc_radii, masks, npc_workers
+        )
+
+
+class ReplayResult:
+    def __init__(self, simulation: Simulation, tick_seconds: List[float]):
+        self.simulation = simulation
+        self.tick_seconds = tick_seconds
+        self.state_hash = simulation.state_hash()
+
+    def get_stats(self):
+        timings = sorted(self.tick_seconds)
+        ticks = max(len(timings), 1)
+        total = sum(timings)
+        return {
+            "ticks": len(timings),
+            "total_ms": total * 1000,
+            "mean_ms": total * 1000 / ticks,
+            "p50_ms": timings[len(timings) // 2] * 1000 if timings else 0.0,
+            "p95_ms": timings[int(len(timings) * 0.95)] * 1000 if timings else 0.0,
+            "max_ms": timings[-1] * 1000 if timings else 0.0,
+            "ticks_per_second": len(timings) / total if total else 0.0,
+        }
+
+
+def replay(recording: InputRecording, **simulation_options) -> ReplayResult:
+    # Replays with the recorded worker count unless the caller overrides it.
+    simulation_options.setdefault("npc_workers", recording.npc_workers)
+    simulation = Simulation(
+        recording.width,
+        recording.height,
+        recording.cell_size,
+        recording.tick_rate,
+        seed=recording.seed,
+        player_radius=recording.player_radius,
+        npc_radii=recording.npc_radii or None,
+        **simulation_options,
+    )
+    tick_seconds = []
+    commands = [decode_command(mask) for mask in range(32)]
+    clock = time.perf_counter
+    for mask in recording.masks:
+        started = clock()
+        if mask & RESET:
+            simulation.reset()
+        simulation.step(commands[mask])
+        tick_seconds.append(clock() - started)
+    simulation.shutdown()
+    return ReplayResult(simulation, tick_seconds)
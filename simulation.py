@@ -0,0 +1,218 @@
+import hashlib
+import random
+import struct
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fsm import State
+from npc import NPC
+from npc_manager import NPCManager
+from npc_shards import ShardedNPCs
+from path_service import TimeSlicedPathService
+from pathfinding import Pathfinding
+
+NPC_SPAWNS = ((200, 200), (1000, 200), (200, 600), (1000, 600))
+
+
+class InputCommand(NamedTuple):
+    move_x: int = 0
+    move_y: int = 0
+
+    @property
+    def moving(self) -> bool:
+        return bool(self.move_x or self.move_y)
+
+
+IDLE = InputCommand()
+
+
+class Simulation:
+    def __init__(
+        self,
+        width: int = 1200,
+        height: int = 800,
+        cell_size: int = 40,
+        tick_rate: int = 60,
+        seed: Optional[int] = None,
+        player_radius: int = 25,
+        npc_sprites: Optional[Sequence[Tuple[str, object]]] = None,
+        npc_radii: Optional[Sequence[int]] = None,
+        npc_workers: int = 0,
+        npc_arrays: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        # npc_arrays hands the NPC manager caller-owned field arrays (one
+        # slot per spawn), so a batch of worlds can keep all NPC state in
+        # shared arrays.
+        if npc_arrays is not None and npc_workers > 0:
+            raise ValueError("npc_arrays cannot be combined with npc_workers")
+        self.width = width
+        self.height = height
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        # Everything random in the simulation flows from this seed, so a
+        # seed plus the input commands reproduce a session exactly.
+        self.seed = random.getrandbits(63) if seed is None else seed
+        self.rng = random.Random(self.seed)
+
+        self.cell_size = cell_size
+        self.grid_width = width // cell_size
+        self.grid_height = height // cell_size
+
+        self.player_x = width // 2
+        self.player_y = height // 2
+        self.previous_player_pos = (self.player_x, self.player_y)
+        self.player_radius = player_radius
+        self.player_speed = 240
+        self.player_health = 100
+        self.max_player_health = 100
+        self.attack_damage = 5
+        self.time_alive = 0
+        self.ticks = 0
+
+        self.npc_spawns = list(NPC_SPAWNS)
+
+        self.pathfinding = Pathfinding(self.grid_width, self.grid_height, cell_size)
+        self.setup_obstacles()
+        self.path_service = TimeSlicedPathService(self.pathfinding)
+
+        self.npcs = []
+        self.shards: Optional[ShardedNPCs] = None
+        if npc_workers > 0:
+            self.shards = ShardedNPCs(
+                self.pathfinding, self.npc_spawns, npc_workers, tick_rate, npc_sprites, npc_radii
+            )
+            self.npc_manager = self.shards.manager
+            self.npcs = self.shards.npcs
+        else:
+            self.npc_manager = NPCManager(tick_rate=tick_rate, arrays=npc_arrays)
+            self.setup_npcs(npc_sprites, npc_radii)
+
+    def setup_obstacles(self):
+        num_obstacles = 18
+        attempts = 0
+        placed = 0
+        while placed < num_obstacles and attempts < 100:
+            x = self.rng.randint(2, self.grid_width - 3) * self.cell_size
+            y = self.rng.randint(2, self.grid_height - 3) * self.cell_size
+            grid_x = x // self.cell_size
+            grid_y = y // self.cell_size
+
+            player_grid_x = self.player_x // self.cell_size
+            player_grid_y = self.player_y // self.cell_size
+
+            if abs(grid_x - player_grid_x) > 3 or abs(grid_y - player_grid_y) > 3:
+                self.pathfinding.add_obstacle(x, y)
+                if self.spawns_connected():
+                    placed += 1
+                else:
+                    self.pathfinding.remove_obstacle(x, y)
+            attempts += 1
+
+    def spawns_connected(self) -> bool:
+        player = self.pathfinding.world_to_index((self.player_x, self.player_y))
+        return all(
+            self.pathfinding.connected(self.pathfinding.world_to_index(spawn), player)
+            for spawn in self.npc_spawns
+        )
+
+    def setup_npcs(
+        self,
+        npc_sprites: Optional[Sequence[Tuple[str, object]]] = None,
+        npc_radii: Optional[Sequence[int]] = None,
+    ):
+        for i, (x, y) in enumerate(self.npc_spawns):
+            sprite_name, sprite = npc_sprites[i % len(npc_sprites)] if npc_sprites else (None, None)
+            npc = NPC(
+                x,
+                y,
+                self.pathfinding,
+                sprite=sprite,
+                sprite_name=sprite_name,
+                path_service=self.path_service,
+                manager=self.npc_manager,
+                radius=npc_radii[i] if npc_radii else None,
+            )
+            self.npcs.append(npc)
+
+    @property
+    def player_pos(self) -> Tuple[float, float]:
+        return (self.player_x, self.player_y)
+
+    @property
+    def player_dead(self) -> bool:
+        return self.player_health <= 0
+
+    def reset(self):
+        self.player_x = self.width // 2
+        self.player_y = self.height // 2
+        self.player_health = self.max_player_health
+        self.time_alive = 0
+        self.ticks = 0
+
+        for npc in self.npcs:
+            npc.x = npc.start_x
+            npc.y = npc.start_y
+            npc.health = npc.max_health
+            npc.fsm.change_state(State.PATROL)
+            npc.clear_path()
+        if self.shards is not None:
+            self.shards.reset()
+        self.npc_manager.save_previous()
+        self.previous_player_pos = self.player_pos
+
+    def move_player(self, command: InputCommand):
+        step = self.player_speed * self.dt
+        new_x = self.player_x + command.move_x * step
+        new_y = self.player_y + command.move_y * step
+
+        radius = self.player_radius
+        body_radius = self.pathfinding.body_radius(radius)
+
+        if radius <= new_x < self.width - radius:
+            position = (self.player_x, self.player_y)
+            if self.pathfinding.can_move(position, (new_x, self.player_y), body_radius):
+                self.player_x = new_x
+        if radius <= new_y < self.height - radius:
+            position = (self.player_x, self.player_y)
+            if self.pathfinding.can_move(position, (self.player_x, new_y), body_radius):
+                self.player_y = new_y
+
+    def step(self, command: InputCommand = IDLE):
+        self.previous_player_pos = self.player_pos
+        self.npc_manager.save_previous()
+        self.move_player(command)
+        self.time_alive += self.dt
+        self.ticks += 1
+
+        attackers = self.step_npcs(self.player_pos)
+        if attackers:
+            self.player_health = max(0, self.player_health - self.attack_damage * len(attackers))
+
+    def step_npcs(self, player_pos: Tuple[float, float]) -> List[NPC]:
+        # The NPC half of a tick; returns the NPCs whose attack landed.
+        if self.shards is None:
+            self.pathfinding.update_flow_field(player_pos)
+            attackers = self.npc_manager.update(player_pos)
+        else:
+            attackers = self.shards.step(player_pos)
+        self.path_service.update()
+        return attackers
+
+    def state_hash(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(
+            struct.pack(
+                "<ddiq", self.player_x, self.player_y, self.player_health, self.ticks
+            )
+        )
+        manager = self.npc_manager
+        count = manager.count
+        for name in ("x", "y", "health", "attack_cooldown", "state"):
+            digest.update(getattr(manager, name)[:count].tobytes())
+        return digest.hexdigest()
+
+    def shutdown(self):
+        self.path_service.shutdown()
+        if self.shards is not None:
+            self.shards.close()
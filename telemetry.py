@@ -0,0 +1,84 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+
+
+class SearchTelemetry:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.searches = 0
+        self.successes = 0
+        self.failures = 0
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.heap_peak = 0
+        self.path_length = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        # One count per bucket in LATENCY_BUCKETS_MS plus a final overflow
+        # bucket for anything slower than the last bound.
+        self.histogram: List[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.last: Optional[Dict[str, float]] = None
+
+    def record(
+        self,
+        expanded: int,
+        pushed: int,
+        heap_peak: int,
+        path_length: int,
+        seconds: float,
+    ):
+        self.searches += 1
+        if path_length:
+            self.successes += 1
+        else:
+            self.failures += 1
+        self.nodes_expanded += expanded
+        self.nodes_pushed += pushed
+        if heap_peak > self.heap_peak:
+            self.heap_peak = heap_peak
+        self.path_length += path_length
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.histogram[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+        self.last = {
+            "expanded": expanded,
+            "pushed": pushed,
+            "heap_peak": heap_peak,
+            "path_length": path_length,
+            "success": bool(path_length),
+            "ms": seconds * 1000,
+        }
+
+    def percentile_ms(self, fraction: float) -> float:
+        # Upper bound of the bucket holding the requested rank, capped by the
+        # slowest search actually seen.
+        slowest = self.max_seconds * 1000
+        rank = fraction * self.searches
+        seen = 0
+        for bucket, count in enumerate(self.histogram[:-1]):
+            seen += count
+            if count and seen >= rank:
+                return min(LATENCY_BUCKETS_MS[bucket], slowest)
+        return slowest
+
+    def get_stats(self) -> Dict[str, float]:
+        searches = max(self.searches, 1)
+        return {
+            "searches": self.searches,
+            "successes": self.successes,
+            "failures": self.failures,
+            "nodes_expanded": self.nodes_expanded,
+            "nodes_pushed": self.nodes_pushed,
+            "heap_peak": self.heap_peak,
+            "mean_expanded": self.nodes_expanded / searches,
+            "mean_path_length": self.path_length / max(self.successes, 1),
+            "mean_ms": self.total_seconds * 1000 / searches,
+            "p50_ms": self.percentile_ms(0.5),
+            "p95_ms": self.percentile_ms(0.95),
+            "max_ms": self.max_seconds * 1000,
+        }
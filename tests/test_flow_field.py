@@ -0,0 +1,44 @@
+import math
+
+from fsm import State
+from npc import NPC
+from npc_manager import NPCManager
+from pathfinding import Pathfinding
+from path_service import TimeSlicedPathService
+
+
+def corner_layout():
+    # Walls at cells (5, 5) and (6, 6) leave only a diagonal squeeze between
+    # cell (5, 6) and cell (6, 5).
+    pathfinding = Pathfinding(12, 12, 40)
+    pathfinding.add_obstacle(5 * 40, 5 * 40)
+    pathfinding.add_obstacle(6 * 40, 6 * 40)
+    return pathfinding
+
+
+def test_flow_step_does_not_cut_blocked_corner():
+    pathfinding = corner_layout()
+    npc_pos = pathfinding.index_to_world(pathfinding.cell_index(5, 6))
+    step = pathfinding.get_flow_step(npc_pos, (270, 210), radius=15)
+    assert step is not None
+    assert pathfinding.world_to_index(step) != pathfinding.cell_index(6, 5)
+
+
+def test_chasing_npc_gets_around_blocked_corner():
+    pathfinding = corner_layout()
+    manager = NPCManager()
+    npc_pos = pathfinding.index_to_world(pathfinding.cell_index(5, 6))
+    npc = NPC(
+        *npc_pos,
+        pathfinding,
+        path_service=TimeSlicedPathService(pathfinding),
+        manager=manager,
+    )
+    npc.fsm.change_state(State.CHASE)
+    player_pos = (270, 210)
+    for _ in range(600):
+        pathfinding.update_flow_field(player_pos)
+        manager.update(player_pos)
+        if math.dist((npc.x, npc.y), player_pos) <= npc.attack_range:
+            break
+    assert math.dist((npc.x, npc.y), player_pos) <= npc.attack_range
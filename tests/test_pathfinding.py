@@ -0,0 +1,95 @@
+import random
+
+from pathfinding import Pathfinding
+
+GRID_WIDTH = 24
+GRID_HEIGHT = 18
+CELL_SIZE = 40
+
+
+def rebuilt(pathfinding):
+    # A second grid loaded from the same cells computes everything from
+    # scratch.
+    fresh = Pathfinding(GRID_WIDTH, GRID_HEIGHT, CELL_SIZE)
+    fresh.load_snapshot(pathfinding.snapshot())
+    return fresh
+
+
+def random_edits(seed, count=400):
+    rng = random.Random(seed)
+    pathfinding = Pathfinding(GRID_WIDTH, GRID_HEIGHT, CELL_SIZE)
+    pathfinding._ensure_wall_distance()
+    for _ in range(count):
+        x = rng.randrange(GRID_WIDTH) * CELL_SIZE
+        y = rng.randrange(GRID_HEIGHT) * CELL_SIZE
+        # Biased towards adding, so the grid fills up enough to split.
+        if rng.random() < 0.7:
+            pathfinding.add_obstacle(x, y)
+        else:
+            pathfinding.remove_obstacle(x, y)
+        yield pathfinding
+
+
+def test_components_match_relabelling_after_random_edits():
+    for seed in range(4):
+        for step, pathfinding in enumerate(random_edits(seed)):
+            if step % 10:
+                continue
+            fresh = rebuilt(pathfinding)
+            # Labels differ between the two, but they must partition the
+            # walkable cells the same way.
+            pairs = {}
+            for index in range(pathfinding.size):
+                label = pathfinding.component_of(index)
+                fresh_label = fresh.component_of(index)
+                assert (label < 0) == (fresh_label < 0)
+                if label >= 0:
+                    assert pairs.setdefault(label, fresh_label) == fresh_label
+            assert len(set(pairs.values())) == len(pairs)
+
+
+def test_wall_distance_matches_rebuild_after_random_edits():
+    for seed in range(4):
+        for step, pathfinding in enumerate(random_edits(seed)):
+            if step % 10:
+                continue
+            fresh = rebuilt(pathfinding)
+            fresh._ensure_wall_distance()
+            assert pathfinding.wall_distance == fresh.wall_distance
+            for radius in (10, 15, 25):
+                assert pathfinding.clearance_mask(radius) == fresh.clearance_mask(radius)
+
+
+def test_cache_serves_suffixes_of_stored_paths():
+    pathfinding = Pathfinding(GRID_WIDTH, GRID_HEIGHT, CELL_SIZE)
+    start = pathfinding.cell_index(1, 1)
+    goal = pathfinding.cell_index(20, 15)
+    path, position = pathfinding.cached_search(start, goal)
+    assert position == 0 and path[0] == start and path[-1] == goal
+
+    middle = len(path) // 2
+    suffix, position = pathfinding.cached_search(path[middle], goal)
+    assert suffix is path and position == middle
+    assert pathfinding.cache_hits == 1
+
+    # Another radius searches its own clearance mask and never shares.
+    assert pathfinding.cache_lookup(path[middle], goal, 15) is None
+
+
+def test_cache_is_invalidated_by_grid_edits():
+    pathfinding = Pathfinding(GRID_WIDTH, GRID_HEIGHT, CELL_SIZE)
+    start = pathfinding.cell_index(1, 1)
+    goal = pathfinding.cell_index(20, 15)
+    path, _ = pathfinding.cached_search(start, goal)
+
+    blocked = path[len(path) // 2]
+    pathfinding.add_obstacle(*pathfinding.index_to_world(blocked))
+    assert pathfinding.cache_lookup(path[1], goal) is None
+    assert pathfinding.get_cache_stats()["size"] == 0
+
+    detour, position = pathfinding.cached_search(start, goal)
+    assert position == 0 and blocked not in detour
+    assert all(pathfinding.walkable[index] for index in detour)
+
+    pathfinding.remove_obstacle(*pathfinding.index_to_world(blocked))
+    assert pathfinding.cache_lookup(start, goal) is None
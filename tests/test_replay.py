@@ -0,0 +1,57 @@
+import random
+
+from replay import RESET, InputRecording, replay
+from simulation import InputCommand, Simulation
+
+
+def record_session(path, ticks=400, reset_at=200, **simulation_options):
+    simulation = Simulation(seed=1234, **simulation_options)
+    recording = InputRecording.for_simulation(simulation)
+    rng = random.Random(5)
+    command = InputCommand()
+    try:
+        for tick in range(ticks):
+            if tick % 20 == 0:
+                command = InputCommand(rng.randint(-1, 1), rng.randint(-1, 1))
+            if tick == reset_at:
+                simulation.reset()
+                recording.mark_reset()
+            recording.record(command)
+            simulation.step(command)
+        live_hash = simulation.state_hash()
+    finally:
+        simulation.shutdown()
+    recording.save(path)
+    return live_hash
+
+
+def test_replay_matches_live_session_across_reset(tmp_path):
+    path = tmp_path / "session.npr"
+    live_hash = record_session(path)
+    result = replay(InputRecording.load(path))
+    assert result.state_hash == live_hash
+    assert result.get_stats()["ticks"] == 400
+
+
+def test_reset_flag_is_replayed():
+    # The same inputs without the reset end somewhere else.
+    simulation = Simulation(seed=1234)
+    recording = InputRecording.for_simulation(simulation)
+    for _ in range(100):
+        recording.record(InputCommand(1, 0))
+    recording.mark_reset()
+    recording.record(InputCommand(0, 1))
+    reset_hash = replay(recording).state_hash
+    recording.masks[-1] &= ~RESET
+    assert replay(recording).state_hash != reset_hash
+    simulation.shutdown()
+
+
+def test_sharded_replay_uses_recorded_worker_count(tmp_path):
+    path = tmp_path / "sharded.npr"
+    live_hash = record_session(path, ticks=200, reset_at=100, npc_workers=2)
+    recording = InputRecording.load(path)
+    assert recording.npc_workers == 2
+    result = replay(recording)
+    assert result.simulation.shards is not None
+    assert result.state_hash == live_hash
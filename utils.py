@@ -12,6 +12,17 @@ def normalize_vector(x: float, y: float) -> tuple:
     return (x / length, y / length)
 
 
+def point_segment_distance(point: tuple, start: tuple, end: tuple) -> float:
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return distance(point, start)
+    t = ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / length_sq
+    t = max(0.0, min(1.0, t))
+    return distance(point, (start[0] + t * dx, start[1] + t * dy))
+
+
 def clamp(value: float, min_val: float, max_val: float) -> float:
     return max(min_val, min(value, max_val))
 